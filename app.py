@@ -1,12 +1,34 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, abort, g, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from werkzeug.middleware.proxy_fix import ProxyFix
 import requests
 import os
 from dotenv import load_dotenv
-from collections import deque
+from collections import deque, OrderedDict
+from functools import wraps
 import hashlib
-from sqlalchemy import text
+from sqlalchemy import text, event, update, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import html
+import hmac
+import inspect
+import io
+import tracemalloc
+import gzip
+import json
+import random
+import re
+import sys
+import threading
+import time
+import atexit
+import catalog_io
+
+try:
+    import brotli  # 可选依赖：未安装时只生成 gzip 版本
+except ImportError:
+    brotli = None
 
 # 加载环境变量
 load_dotenv()
@@ -23,13 +45,56 @@ else:
 app = Flask(__name__)
 
 _is_serverless = bool(os.getenv('VERCEL') or os.getenv('AWS_LAMBDA_FUNCTION_NAME'))
-_sqlite_path = '/tmp/foods.db' if _is_serverless else 'foods.db'
+_sqlite_path = os.getenv('SQLITE_PATH') or ('/tmp/foods.db' if _is_serverless else 'foods.db')
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{_sqlite_path}'  # 使用SQLite数据库
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 
 recent_recommendation_history = {}
 
+# 前面有几层可信反向代理（如 Vercel 为 1）；只有配置了才信任 X-Forwarded-For，否则客户端可伪造该头绕过限流
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '1' if _is_serverless else '0'))
+if TRUSTED_PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+
+# 准入控制：单客户端令牌桶限流 + 单路由并发限制，超过阈值进入降级模式
+RATE_LIMIT_PER_SEC = float(os.getenv('RATE_LIMIT_PER_SEC', '5'))
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', '20'))
+ROUTE_MAX_CONCURRENCY = int(os.getenv('ROUTE_MAX_CONCURRENCY', '32'))
+ROUTE_DEGRADE_CONCURRENCY = int(os.getenv('ROUTE_DEGRADE_CONCURRENCY', '16'))
+WEATHER_SLOW_SECONDS = float(os.getenv('WEATHER_SLOW_SECONDS', '1.5'))
+WEATHER_SLOW_COOLDOWN = float(os.getenv('WEATHER_SLOW_COOLDOWN', '30'))
+
+# 多 worker 共享食物库时，每隔 CATALOG_CHECK_INTERVAL 秒读取一次数据库中的目录版本号
+CATALOG_CHECK_INTERVAL = float(os.getenv('CATALOG_CHECK_INTERVAL', '1'))
+
+# 用户反馈事件：写入内存环形缓冲区，按数量/时间批量落库，并折算为用户-食物偏好分
+EVENT_BUFFER_SIZE = int(os.getenv('EVENT_BUFFER_SIZE', '10000'))
+EVENT_FLUSH_BATCH = int(os.getenv('EVENT_FLUSH_BATCH', '200'))
+EVENT_FLUSH_INTERVAL = float(os.getenv('EVENT_FLUSH_INTERVAL', '2'))
+EVENT_MAX_PER_REQUEST = int(os.getenv('EVENT_MAX_PER_REQUEST', str(EVENT_FLUSH_BATCH)))  # 单次请求最多提交的事件数
+AFFINITY_WEIGHT = float(os.getenv('AFFINITY_WEIGHT', '30'))  # 每 1 分偏好折合的热量分
+AFFINITY_TTL = float(os.getenv('AFFINITY_TTL', '5'))  # 偏好分缓存有效期，过期后重新读库以看到其他 worker 落库的事件
+
+# 流量采样录制（供 replay.py 回放做性能回归）；REPLAY_MODE 下允许用请求头固定天气和推荐历史
+CAPTURE_LOG = os.getenv('CAPTURE_LOG')
+CAPTURE_SAMPLE_RATE = float(os.getenv('CAPTURE_SAMPLE_RATE', '0.01'))
+REPLAY_MODE = os.getenv('REPLAY_MODE') == '1'
+
+# 按需性能剖析：仅在配置了 PROFILE_TOKEN 时可通过 /admin/profile 开启
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+
+# 天气缓存与后台预取：活跃城市在过期前由后台线程刷新，请求处理基本不阻塞在天气接口上
+OPENWEATHER_API_BASE = os.getenv('OPENWEATHER_API_BASE', 'http://api.openweathermap.org/data/2.5').rstrip('/')
+WEATHER_CACHE_TTL = float(os.getenv('WEATHER_CACHE_TTL', '600'))
+WEATHER_STALE_MAX = float(os.getenv('WEATHER_STALE_MAX', '1800'))
+WEATHER_PREFETCH_LEAD = float(os.getenv('WEATHER_PREFETCH_LEAD', '120'))
+WEATHER_PREFETCH_MIN_INTERVAL = float(os.getenv('WEATHER_PREFETCH_MIN_INTERVAL', '1.0'))
+WEATHER_ACTIVITY_HALF_LIFE = float(os.getenv('WEATHER_ACTIVITY_HALF_LIFE', '1800'))
+WEATHER_BACKOFF_BASE = float(os.getenv('WEATHER_BACKOFF_BASE', '10'))
+WEATHER_BACKOFF_MAX = float(os.getenv('WEATHER_BACKOFF_MAX', '1800'))
+WEATHER_PREFETCH_ENABLED = os.getenv('WEATHER_PREFETCH', '0' if _is_serverless else '1') == '1'
+
 # 食物模型类
 class Food(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -42,12 +107,151 @@ class Food(db.Model):
     allergens = db.Column(db.String(100), nullable=True)  # 过敏源信息（例如：花生, 牛奶）
     image_url = db.Column(db.String(255), nullable=True)
 
+class FoodRecord:
+    """
+    推荐流程使用的只读食物记录：由批量列查询生成，不受 session 跟踪，
+    数值字段预先转换，food_type/recommend_time/过敏源字符串做 intern
+    """
+    __slots__ = ('id', 'food_name', 'calories', 'sugar_content', 'food_type', 'recommend_time',
+                 'weather_conditions', 'allergens', 'allergen_set', 'image_url')
+
+    def __init__(self, id, food_name, calories, sugar_content, food_type, recommend_time,
+                 weather_conditions, allergens, image_url):
+        init = object.__setattr__
+        init(self, 'id', id)
+        init(self, 'food_name', food_name)
+        init(self, 'calories', int(calories or 0))
+        init(self, 'sugar_content', float(sugar_content or 0))
+        init(self, 'food_type', sys.intern(food_type) if food_type else food_type)
+        init(self, 'recommend_time', sys.intern(recommend_time) if recommend_time else recommend_time)
+        init(self, 'weather_conditions', weather_conditions)
+        init(self, 'allergens', sys.intern(allergens) if allergens else allergens)
+        init(self, 'allergen_set', frozenset(sys.intern(a.strip()) for a in allergens.split(',')) if allergens else frozenset())
+        init(self, 'image_url', image_url)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('FoodRecord 是只读的')
+
+    def __repr__(self):
+        return f"<FoodRecord {self.id} {self.food_name}>"
+
+_FOOD_RECORD_COLUMNS = (
+    Food.id, Food.food_name, Food.calories, Food.sugar_content, Food.food_type,
+    Food.recommend_time, Food.weather_conditions, Food.allergens, Food.image_url
+)
+
+def _query_food_records(*criteria):
+    rows = db.session.query(*_FOOD_RECORD_COLUMNS).filter(*criteria).all()
+    return [FoodRecord(*row) for row in rows]
+
 # 用户模型类
 class User(db.Model):
     user_id = db.Column(db.Integer, primary_key=True)
     health_condition = db.Column(db.String(100), nullable=True)  # 健康状况
     allergic_foods = db.Column(db.String(100), nullable=True)  # 过敏食物，多个以逗号分隔
 
+# 食物目录版本：每次写 Food 表都在同一事务内 +1，各 worker 据此丢弃基于旧目录的缓存
+class CatalogVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# 用户对推荐的反馈事件：accept 接受、swap 换成备选、reject 拒绝
+class FoodEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    food_id = db.Column(db.Integer, nullable=False)
+    event_type = db.Column(db.String(20), nullable=False)
+    from_food_id = db.Column(db.Integer, nullable=True)  # swap 时被换掉的食物
+    created_at = db.Column(db.Float, nullable=False)
+
+# 由反馈事件折算出的用户-食物偏好分
+class FoodAffinity(db.Model):
+    user_id = db.Column(db.Integer, primary_key=True)
+    food_id = db.Column(db.Integer, primary_key=True)
+    score = db.Column(db.Float, nullable=False, default=0)
+
+def _new_catalog_state(version: int):
+    return {
+        'version': version,
+        'candidates': OrderedDict(),  # (time, weather, max_calories) -> 候选食物列表
+        'payloads': {},  # 序列化好的响应体，例如 /debug/foods
+    }
+
+_catalog_lock = threading.Lock()
+_catalog_state = _new_catalog_state(None)
+_catalog_checked_at = 0.0
+
+def _bump_catalog_version(connection):
+    result = connection.execute(update(CatalogVersion).where(CatalogVersion.id == 1).values(version=CatalogVersion.version + 1))
+    if result.rowcount == 0:
+        connection.execute(insert(CatalogVersion).values(id=1, version=1))
+
+def _read_catalog_version():
+    return db.session.execute(text("SELECT version FROM catalog_version WHERE id = 1")).scalar() or 0
+
+def _mark_catalog_changed(session):
+    _bump_catalog_version(session.connection())
+    session.info['catalog_changed'] = True
+
+@event.listens_for(Session, 'after_flush')
+def _bump_catalog_on_flush(session, flush_context):
+    touched = any(isinstance(obj, Food) for obj in session.new) or any(isinstance(obj, Food) for obj in session.deleted) \
+        or any(isinstance(obj, Food) and session.is_modified(obj) for obj in session.dirty)
+    if touched:
+        _mark_catalog_changed(session)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bump_catalog_on_bulk_write(orm_execute_state):
+    # 批量 insert/update/delete(Food) 不经过 flush，单独处理
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not Food:
+        return
+    result = orm_execute_state.invoke_statement()
+    _mark_catalog_changed(orm_execute_state.session)
+    return result
+
+@event.listens_for(Session, 'after_commit')
+def _reload_catalog_after_commit(session):
+    # 本进程写入后下一个请求立即重新检查版本，不必等检查间隔
+    global _catalog_checked_at
+    if session.info.pop('catalog_changed', False):
+        _catalog_checked_at = 0.0
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_catalog_change(session):
+    session.info.pop('catalog_changed', None)
+
+def _sync_catalog_state():
+    """
+    版本号变大时整体替换目录状态（候选缓存、序列化结果）；
+    进行中的请求继续使用请求开始时取到的旧状态
+    """
+    global _catalog_state, _catalog_checked_at
+    now = time.monotonic()
+    if now - _catalog_checked_at >= CATALOG_CHECK_INTERVAL:
+        try:
+            version = _read_catalog_version()
+        except Exception:
+            db.session.rollback()
+            version = None  # 表尚未创建
+        with _catalog_lock:
+            _catalog_checked_at = now
+            # 版本号在锁外读取：提交前读到旧版本的线程可能晚于已切到新版本的线程拿到锁，只允许前进
+            current = _catalog_state['version']
+            if version is not None and (current is None or version > current):
+                _catalog_state = _new_catalog_state(version)
+    return _catalog_state
+
+def _current_catalog():
+    state = g.get('catalog_state')
+    return state if state is not None else _catalog_state
+
+@app.before_request
+def _bind_catalog_state():
+    g.catalog_state = _sync_catalog_state()
+
 # 天气映射表，处理中英文天气名称和同义词
 weather_mapping = {
     'Clear': ['晴天', '晴'],
@@ -79,27 +283,232 @@ PRESET_FOOD_IMAGES = {
     '紫菜蛋花汤': 'https://images.unsplash.com/photo-1547592166-23acbe54099c?auto=format&fit=crop&w=800&q=80',
 }
 
+# 城市别名：/debug/weather 默认 '北京'，/recommend 默认 'Beijing'，归一后共用一个缓存项
+CITY_ALIASES = {
+    '北京': 'Beijing', '北京市': 'Beijing', 'peking': 'Beijing',
+    '上海': 'Shanghai', '上海市': 'Shanghai',
+    '广州': 'Guangzhou', '广州市': 'Guangzhou',
+    '深圳': 'Shenzhen', '深圳市': 'Shenzhen',
+    '杭州': 'Hangzhou', '杭州市': 'Hangzhou',
+    '南京': 'Nanjing', '南京市': 'Nanjing',
+    '成都': 'Chengdu', '成都市': 'Chengdu',
+    '重庆': 'Chongqing', '重庆市': 'Chongqing',
+    '武汉': 'Wuhan', '武汉市': 'Wuhan',
+    '西安': "Xi'an", '西安市': "Xi'an",
+    '天津': 'Tianjin', '天津市': 'Tianjin',
+    '香港': 'Hong Kong',
+}
+_CITY_ALIASES_FOLDED = {k.casefold(): v for k, v in CITY_ALIASES.items()}
+
+_weather_lock = threading.Lock()
+_weather_cache = {}  # 城市 key -> {'city', 'weather', 'fetched_at', 'city_id', 'failures', 'next_attempt_at'}
+_city_activity = OrderedDict()  # 城市 key -> [衰减后的请求热度, 上次更新时间]，按最近访问排序
+_CITY_ACTIVITY_SIZE = 1000
+_weather_prefetcher = None
+_weather_paused_until = 0.0  # 上游返回 401/429 后在此之前不再调用
+
+def _normalize_city(city: str):
+    name = str(city or '').strip() or 'Beijing'
+    canonical = _CITY_ALIASES_FOLDED.get(name.casefold(), name)
+    return canonical.casefold(), canonical
+
+def _decayed(activity, now: float):
+    score, last = activity
+    return score * 0.5 ** ((now - last) / WEATHER_ACTIVITY_HALF_LIFE)
+
+def _touch_city(key: str, now: float):
+    # city 来自用户输入，按最近访问淘汰，不依赖预取线程清理（无服务器环境下预取默认关闭）
+    with _weather_lock:
+        activity = _city_activity.get(key)
+        _city_activity[key] = [(_decayed(activity, now) if activity else 0.0) + 1.0, now]
+        _city_activity.move_to_end(key)
+        if len(_city_activity) > _CITY_ACTIVITY_SIZE:
+            _city_activity.popitem(last=False)
+
+def _note_weather_rejection(response):
+    # 401（密钥无效或未激活）/429（超出配额）对所有城市都一样，暂停全部上游调用而不是逐城市重试
+    global _weather_paused_until
+    if response is None or response.status_code not in (401, 429):
+        return
+    pause = WEATHER_BACKOFF_MAX
+    retry_after = response.headers.get('Retry-After', '')
+    if response.status_code == 429 and retry_after.isdigit():
+        pause = float(retry_after)
+    _weather_paused_until = time.monotonic() + pause
+    print(f"天气接口返回 {response.status_code}，暂停调用 {pause:.0f}s")
+
+def _weather_paused(now: float):
+    return now < _weather_paused_until
+
+def _fetch_weather(city: str):
+    """请求 OpenWeatherMap 单城市天气，返回 (天气主信息, 城市ID)"""
+    url = f'{OPENWEATHER_API_BASE}/weather'
+    params = {'q': city, 'appid': api_key, 'units': 'metric', 'lang': 'zh_cn'}
+    started = time.monotonic()
+    try:
+        response = requests.get(url, params=params, timeout=5)
+        _note_weather_latency(time.monotonic() - started)
+        response.raise_for_status()  # 抛出HTTP错误
+        data = response.json()
+        return data['weather'][0]['main'], data.get('id')  # 获取天气主信息，例如：晴、阴、雨等
+    except requests.exceptions.RequestException as e:
+        if isinstance(e, requests.exceptions.Timeout):
+            _note_weather_latency(time.monotonic() - started)
+        _note_weather_rejection(e.response)
+        print(f"获取天气信息失败: {e}")
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        print(f"天气数据解析失败: {e}")
+    return None, None
+
+def _fetch_weather_group(city_ids):
+    """批量接口 /group 一次最多 20 个城市ID，返回 {城市ID: 天气主信息}"""
+    url = f'{OPENWEATHER_API_BASE}/group'
+    params = {'id': ','.join(str(i) for i in city_ids), 'appid': api_key, 'units': 'metric', 'lang': 'zh_cn'}
+    started = time.monotonic()
+    try:
+        response = requests.get(url, params=params, timeout=5)
+        _note_weather_latency(time.monotonic() - started)
+        response.raise_for_status()
+        return {item['id']: item['weather'][0]['main'] for item in response.json().get('list', [])}
+    except requests.exceptions.RequestException as e:
+        _note_weather_rejection(e.response)
+        print(f"批量获取天气信息失败: {e}")
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        print(f"批量天气数据解析失败: {e}")
+    return {}
+
+def _store_weather(key: str, city: str, weather: str, city_id=None):
+    with _weather_lock:
+        previous = _weather_cache.get(key)
+        _weather_cache[key] = {
+            'city': city,
+            'weather': weather,
+            'fetched_at': time.monotonic(),
+            'city_id': city_id if city_id is not None else (previous or {}).get('city_id'),
+            'failures': 0,
+            'next_attempt_at': 0.0
+        }
+
+def _note_refresh_failure(key: str, now: float):
+    # 刷新失败后按指数退避推迟该城市的下次预取，旧值在 STALE_MAX 内继续可用
+    with _weather_lock:
+        entry = _weather_cache.get(key)
+        if entry is None:
+            return
+        entry['failures'] += 1
+        entry['next_attempt_at'] = now + min(WEATHER_BACKOFF_MAX, WEATHER_BACKOFF_BASE * 2 ** (entry['failures'] - 1))
+
+def _cached_weather(city: str, max_age: float = WEATHER_STALE_MAX):
+    # 只读缓存，不发起网络请求（降级模式使用）
+    key, _canonical = _normalize_city(city)
+    entry = _weather_cache.get(key)
+    if entry and time.monotonic() - entry['fetched_at'] < max_age:
+        return entry['weather']
+    return None
+
 # 获取当前天气的函数
 def get_weather(city='Beijing'):
     global api_key  # 使用全局API密钥变量
     if not api_key:
         print("API密钥未配置")
         return None
-    
-    url = f'http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric&lang=zh_cn'
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()  # 抛出HTTP错误
-        data = response.json()
 
-        if response.status_code == 200:
-            weather = data['weather'][0]['main']  # 获取天气主信息，例如：晴、阴、雨等
-            return weather
+    key, canonical = _normalize_city(city)
+    now = time.monotonic()
+    _touch_city(key, now)
+    entry = _weather_cache.get(key)
+    if entry:
+        age = now - entry['fetched_at']
+        # 预取线程会在过期前刷新；已过期但未超过 STALE_MAX 时先返回旧值，由预取线程补刷
+        if age < WEATHER_CACHE_TTL or (age < WEATHER_STALE_MAX and _ensure_weather_prefetcher()):
+            return entry['weather']
+
+    if _weather_paused(now):
+        return entry['weather'] if entry and now - entry['fetched_at'] < WEATHER_STALE_MAX else None
+
+    weather, city_id = _fetch_weather(canonical)
+    if weather:
+        _store_weather(key, canonical, weather, city_id)
+    _ensure_weather_prefetcher()
+    return weather
+
+def _due_weather_cities(now: float):
+    """热度衰减后仍活跃、且缓存即将过期的城市，按过期先后排序（首次获取由请求本身完成）"""
+    due = []
+    with _weather_lock:
+        for key, activity in list(_city_activity.items()):
+            if _decayed(activity, now) < 0.05:
+                del _city_activity[key]
+                continue
+            entry = _weather_cache.get(key)
+            if entry and now - entry['fetched_at'] >= WEATHER_CACHE_TTL - WEATHER_PREFETCH_LEAD \
+                    and now >= entry['next_attempt_at']:
+                due.append((entry['fetched_at'], key, entry))
+    due.sort(key=lambda item: item[0])
+    return [(key, entry) for _fetched_at, key, entry in due]
+
+def _prefetch_weather_once():
+    """
+    刷新一轮到期城市；有城市ID的走 /group 批量接口，每次上游调用之间至少间隔 MIN_INTERVAL。
+    刷新失败的城市指数退避，上游返回 401/429 时本轮剩余城市不再请求
+    """
+    due = _due_weather_cities(time.monotonic())
+    if not due or not api_key or _weather_paused(time.monotonic()):
+        return 0
+
+    calls = 0
+    by_id = {entry['city_id']: key for key, entry in due if entry.get('city_id')}
+    ids = list(by_id)
+    for i in range(0, len(ids), 20):
+        if calls:
+            time.sleep(WEATHER_PREFETCH_MIN_INTERVAL)
+        if _weather_paused(time.monotonic()):
+            return calls
+        chunk = ids[i:i + 20]
+        results = _fetch_weather_group(chunk)
+        calls += 1
+        for city_id in chunk:
+            key = by_id[city_id]
+            if results.get(city_id):
+                _store_weather(key, _weather_cache[key]['city'], results[city_id], city_id)
+            else:
+                _note_refresh_failure(key, time.monotonic())
+
+    for key, entry in due:
+        if entry.get('city_id') in by_id:
+            continue
+        if calls:
+            time.sleep(WEATHER_PREFETCH_MIN_INTERVAL)
+        if _weather_paused(time.monotonic()):
+            return calls
+        weather, city_id = _fetch_weather(entry['city'])
+        calls += 1
+        if weather:
+            _store_weather(key, entry['city'], weather, city_id)
         else:
-            return None
-    except requests.exceptions.RequestException as e:
-        print(f"获取天气信息失败: {e}")
-        return None
+            _note_refresh_failure(key, time.monotonic())
+    return calls
+
+def _weather_prefetch_loop():
+    while True:
+        try:
+            calls = _prefetch_weather_once()
+        except Exception as e:  # 预取失败不影响请求处理，下一轮重试
+            print(f"天气预取失败: {e}")
+            calls = 0
+        time.sleep(WEATHER_PREFETCH_MIN_INTERVAL if calls else min(5.0, WEATHER_PREFETCH_LEAD / 2))
+
+def _ensure_weather_prefetcher():
+    # 无服务器环境下线程会被冻结，默认不启动；返回预取线程是否在运行
+    global _weather_prefetcher
+    if not WEATHER_PREFETCH_ENABLED:
+        return False
+    if _weather_prefetcher is None:
+        with _weather_lock:
+            if _weather_prefetcher is None:
+                _weather_prefetcher = threading.Thread(target=_weather_prefetch_loop, name='weather-prefetch', daemon=True)
+                _weather_prefetcher.start()
+    return True
 
 def get_unsplash_image_url(food_name):
     """
@@ -146,7 +555,157 @@ def _record_recommended_ids(user_id: int, food_ids):
         recent_recommendation_history[user_id] = deque(maxlen=30)
     recent_recommendation_history[user_id].extend([fid for fid in food_ids if fid is not None])
 
-def _food_to_dict(food: 'Food'):
+_admission_lock = threading.Lock()
+_client_buckets = OrderedDict()  # client -> [tokens, last_refill]
+_route_in_flight = {}
+_admission_stats = {}
+_weather_slow_until = 0.0
+_CANDIDATE_CACHE_SIZE = 256
+_CLIENT_BUCKETS_SIZE = 10000
+
+def _note_weather_latency(elapsed: float):
+    # 天气接口变慢时，在冷却期内所有推荐请求都跳过实时天气
+    global _weather_slow_until
+    if elapsed >= WEATHER_SLOW_SECONDS:
+        _weather_slow_until = time.monotonic() + WEATHER_SLOW_COOLDOWN
+
+def _client_key():
+    # 经过 ProxyFix 后 remote_addr 已是可信代理链给出的客户端地址
+    return request.remote_addr or 'unknown'
+
+def _take_token(client: str, now: float):
+    bucket = _client_buckets.get(client)
+    if bucket is None:
+        bucket = [RATE_LIMIT_BURST, now]
+        _client_buckets[client] = bucket
+        if len(_client_buckets) > _CLIENT_BUCKETS_SIZE:
+            _client_buckets.popitem(last=False)
+    else:
+        _client_buckets.move_to_end(client)
+        bucket[0] = min(RATE_LIMIT_BURST, bucket[0] + (now - bucket[1]) * RATE_LIMIT_PER_SEC)
+        bucket[1] = now
+    if bucket[0] < 1:
+        return False
+    bucket[0] -= 1
+    return True
+
+def _admission_controlled(route_key: str):
+    """
+    限流 -> 并发限制 -> 决定是否降级；降级原因写入 g.degrade_reason，
+    由 _filter_foods_for_user 跳过实时天气并复用缓存的候选列表
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            now = time.monotonic()
+            with _admission_lock:
+                stats = _admission_stats.setdefault(route_key, {
+                    'admitted': 0, 'degraded': 0, 'shed_rate_limited': 0, 'shed_overloaded': 0
+                })
+                if not _take_token(_client_key(), now):
+                    stats['shed_rate_limited'] += 1
+                    resp = jsonify({'error': '请求过于频繁，请稍后再试'})
+                    resp.headers['Retry-After'] = '1'
+                    return resp, 429
+                in_flight = _route_in_flight.get(route_key, 0)
+                if in_flight >= ROUTE_MAX_CONCURRENCY:
+                    stats['shed_overloaded'] += 1
+                    resp = jsonify({'error': '服务繁忙，请稍后再试'})
+                    resp.headers['Retry-After'] = '1'
+                    return resp, 503
+                _route_in_flight[route_key] = in_flight + 1
+                stats['admitted'] += 1
+
+                reason = None
+                if in_flight >= ROUTE_DEGRADE_CONCURRENCY:
+                    reason = 'overloaded'
+                elif now < _weather_slow_until:
+                    reason = 'weather_slow'
+                if reason:
+                    stats['degraded'] += 1
+            g.degrade_reason = reason
+            try:
+                return view(*args, **kwargs)
+            finally:
+                with _admission_lock:
+                    _route_in_flight[route_key] -= 1
+        return wrapper
+    return decorator
+
+_capture_lock = threading.Lock()
+
+def _apply_replay_pins(user_id):
+    # X-Replay-Weather: JSON 字符串或 null（录制时天气获取失败）；X-Replay-History: 食物ID的 JSON 数组；
+    # X-Replay-Affinity: {食物ID: 偏好分}；X-Replay-Degrade: 录制时的降级原因或 null，覆盖回放时准入控制的判断
+    pinned_degrade = request.headers.get('X-Replay-Degrade')
+    if pinned_degrade is not None:
+        g.degrade_reason = json.loads(pinned_degrade)
+    pinned_weather = request.headers.get('X-Replay-Weather')
+    if pinned_weather is not None:
+        g.replay_weather = json.loads(pinned_weather)
+    pinned_history = request.headers.get('X-Replay-History')
+    if pinned_history is not None and user_id:
+        recent_recommendation_history[user_id] = deque(json.loads(pinned_history), maxlen=30)
+    pinned_affinity = request.headers.get('X-Replay-Affinity')
+    if pinned_affinity is not None:
+        g.replay_affinity = {int(k): float(v) for k, v in json.loads(pinned_affinity).items()}
+
+def _traffic_capture(view):
+    """
+    按 CAPTURE_SAMPLE_RATE 采样，把请求参数、当时解析到的天气、降级原因、请求前的推荐历史和偏好分、
+    响应摘要和耗时追加到 CAPTURE_LOG（JSONL）
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = request.args.get('user_id', type=int)
+        if REPLAY_MODE:
+            _apply_replay_pins(user_id)
+        if not CAPTURE_LOG or random.random() >= CAPTURE_SAMPLE_RATE:
+            return view(*args, **kwargs)
+
+        history = list(recent_recommendation_history.get(user_id) or [])
+        affinity = dict(_get_affinity(user_id)) if user_id else {}
+        started = time.perf_counter()
+        resp = app.make_response(view(*args, **kwargs))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        record = {
+            'ts': time.time(),
+            'path': request.path,
+            'args': request.args.to_dict(),
+            'weather': g.get('resolved_weather'),
+            'degrade_reason': g.get('degrade_reason'),
+            'history': history,
+            'affinity': affinity,
+            'status': resp.status_code,
+            'digest': hashlib.sha1(resp.get_data()).hexdigest(),
+            'latency_ms': round(elapsed_ms, 3)
+        }
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        try:
+            with _capture_lock, open(CAPTURE_LOG, 'a', encoding='utf-8') as fh:
+                fh.write(line + '\n')
+        except OSError as e:
+            print(f"写入流量录制失败: {e}")
+        return resp
+    return wrapper
+
+def _cached_candidates(key):
+    cache = _current_catalog()['candidates']
+    with _admission_lock:
+        foods = cache.get(key)
+        if foods is not None:
+            cache.move_to_end(key)
+        return foods
+
+def _store_candidates(key, foods):
+    cache = _current_catalog()['candidates']
+    with _admission_lock:
+        cache[key] = foods
+        cache.move_to_end(key)
+        if len(cache) > _CANDIDATE_CACHE_SIZE:
+            cache.popitem(last=False)
+
+def _food_to_dict(food: 'FoodRecord'):
     return {
         'id': food.id,
         'food_name': food.food_name,
@@ -289,135 +848,552 @@ def _bump_image_url_version():
     if changed:
         db.session.commit()
 
-def _filter_foods_for_user(user_id: int, user_time: str, user_city: str, user_max_calories: int, condition_override: str = None):
-    user, err = _get_user_or_error(user_id)
-    if err:
-        return None, err, None
+def _parse_conditions(raw: str):
+    s = str(raw or '').strip()
+    if not s:
+        return []
+    for sep in [',', '，', '、', ';', '；', '+']:
+        s = s.replace(sep, ',')
+    parts = []
+    for p in s.split(','):
+        v = str(p or '').strip()
+        if not v:
+            continue
+        if v not in parts:
+            parts.append(v)
+    return parts
 
+def _user_health_profile(user: 'User', condition_override: str = None):
+    """返回 (健康状况列表, 过敏食物集合)"""
     health_condition_raw = condition_override if condition_override else user.health_condition
     if health_condition_raw is not None:
         health_condition_raw = str(health_condition_raw).strip()
         if health_condition_raw in ('无', 'none', 'None'):
             health_condition_raw = ''
-
-    def _parse_conditions(raw: str):
-        s = str(raw or '').strip()
-        if not s:
-            return []
-        for sep in [',', '，', '、', ';', '；', '+']:
-            s = s.replace(sep, ',')
-        parts = []
-        for p in s.split(','):
-            v = str(p or '').strip()
-            if not v:
-                continue
-            if v not in parts:
-                parts.append(v)
-        return parts
-
     conditions = _parse_conditions(health_condition_raw)
-    health_condition = ','.join(conditions)
-    allergic_foods = [food.strip() for food in user.allergic_foods.split(',')] if user.allergic_foods else []
-
-    weather = get_weather(user_city)
-    fallback_weather_used = False
+    allergic_foods = set(food.strip() for food in user.allergic_foods.split(',')) if user.allergic_foods else set()
+    return conditions, allergic_foods
+
+def _resolve_request_weather(user_city: str):
+    """返回 (天气, 是否使用了默认天气)；回放时用固定天气，降级时只读缓存"""
+    if 'replay_weather' in g:
+        weather = g.replay_weather
+    elif g.get('degrade_reason'):
+        weather = _cached_weather(user_city)
+    else:
+        weather = get_weather(user_city)
+    g.resolved_weather = weather
     if not weather:
-        weather = "晴天"
-        fallback_weather_used = True
         print("无法获取天气信息，使用默认天气: 晴天")
+        return "晴天", True
+    return weather, False
 
-    matching_weathers = weather_mapping.get(weather, [weather])
-    print(f"天气: {weather}, 匹配的天气条件: {matching_weathers}")
-
-    from sqlalchemy import or_
-    weather_conditions = [Food.weather_conditions.like(f'%{w}%') for w in matching_weathers]
-    print(f"天气条件查询: {weather_conditions}")
-
-    food_recommendations = Food.query.filter(
-        Food.recommend_time == user_time,
-        or_(*weather_conditions),
-        Food.calories <= user_max_calories
-    ).all()
-    print(f"天气条件筛选后: {[food.food_name for food in food_recommendations]}")
-
-    if not food_recommendations:
-        print("天气条件筛选结果为空，放宽天气限制")
-        food_recommendations = Food.query.filter(
-            Food.recommend_time == user_time,
-            Food.calories <= user_max_calories
-        ).all()
-        print(f"放宽天气限制后: {[food.food_name for food in food_recommendations]}")
-    print(f"初始食物推荐: {[food.food_name for food in food_recommendations]}")
-
+def _apply_condition_filters(food_recommendations, conditions):
+    """按健康状况逐项收窄候选（收窄后为空则保留原列表）并排序，返回 (候选列表, 提示)"""
     condition_notes = []
-    print(f"健康状况: {health_condition}")
-    if conditions:
-        print(f"健康状况筛选前: {[food.food_name for food in food_recommendations]}")
-        cond_set = set(conditions)
-
-        if '糖尿病' in cond_set:
-            low_sugar = [food for food in food_recommendations if float(food.sugar_content or 0) <= 5]
-            if low_sugar:
-                food_recommendations = low_sugar
-            condition_notes.append('已按糖尿病偏好：优先低糖')
-
-        if '肥胖' in cond_set:
-            low_cal = [food for food in food_recommendations if int(food.calories or 0) <= 350]
-            if low_cal:
-                food_recommendations = low_cal
-            condition_notes.append('已按控能量偏好：优先低热量')
-
-        if '高血压' in cond_set:
-            if hasattr(Food, 'salt_content'):
-                low_salt = [food for food in food_recommendations if float(getattr(food, 'salt_content', 0) or 0) < 1.5]
-                if low_salt:
-                    food_recommendations = low_salt
-                condition_notes.append('已按高血压偏好：优先低盐')
-            else:
-                condition_notes.append('当前食物库无盐分字段，高血压仅做保守排序：优先低热量/低糖')
-
-        if '高血脂' in cond_set:
-            if hasattr(Food, 'fat_content'):
-                low_fat = [food for food in food_recommendations if float(getattr(food, 'fat_content', 0) or 0) < 10]
-                if low_fat:
-                    food_recommendations = low_fat
-                condition_notes.append('已按高血脂偏好：优先低脂')
-            else:
-                condition_notes.append('当前食物库无脂肪字段，高血脂仅做保守排序：优先低热量/低糖')
-
-        if '糖尿病' in cond_set:
-            food_recommendations = sorted(food_recommendations, key=lambda f: (float(f.sugar_content or 0), int(f.calories or 0)))
+    print(f"健康状况: {','.join(conditions)}")
+    if not conditions:
+        return food_recommendations, condition_notes
+    print(f"健康状况筛选前: {[food.food_name for food in food_recommendations]}")
+    cond_set = set(conditions)
+
+    if '糖尿病' in cond_set:
+        low_sugar = [food for food in food_recommendations if food.sugar_content <= 5]
+        if low_sugar:
+            food_recommendations = low_sugar
+        condition_notes.append('已按糖尿病偏好：优先低糖')
+
+    if '肥胖' in cond_set:
+        low_cal = [food for food in food_recommendations if food.calories <= 350]
+        if low_cal:
+            food_recommendations = low_cal
+        condition_notes.append('已按控能量偏好：优先低热量')
+
+    # 候选是 FoodRecord：新增营养字段需同时加入 _FOOD_RECORD_COLUMNS 和 FoodRecord，只加在 Food 模型上不会生效
+    if '高血压' in cond_set:
+        if hasattr(FoodRecord, 'salt_content'):
+            low_salt = [food for food in food_recommendations if float(food.salt_content or 0) < 1.5]
+            if low_salt:
+                food_recommendations = low_salt
+            condition_notes.append('已按高血压偏好：优先低盐')
         else:
-            food_recommendations = sorted(food_recommendations, key=lambda f: (int(f.calories or 0), float(f.sugar_content or 0)))
+            condition_notes.append('当前食物库无盐分字段，高血压仅做保守排序：优先低热量/低糖')
+
+    if '高血脂' in cond_set:
+        if hasattr(FoodRecord, 'fat_content'):
+            low_fat = [food for food in food_recommendations if float(food.fat_content or 0) < 10]
+            if low_fat:
+                food_recommendations = low_fat
+            condition_notes.append('已按高血脂偏好：优先低脂')
+        else:
+            condition_notes.append('当前食物库无脂肪字段，高血脂仅做保守排序：优先低热量/低糖')
+
+    if '糖尿病' in cond_set:
+        food_recommendations = sorted(food_recommendations, key=lambda f: (f.sugar_content, f.calories))
+    else:
+        food_recommendations = sorted(food_recommendations, key=lambda f: (f.calories, f.sugar_content))
+    return food_recommendations, condition_notes
 
-    print(f"过敏食物列表: {allergic_foods}")
+def _finish_filtering(food_recommendations, conditions, allergic_foods):
+    """健康状况筛选 -> 过敏源过滤 -> 无健康状况时按热量降序，返回 (候选列表, 提示)"""
+    food_recommendations, condition_notes = _apply_condition_filters(food_recommendations, conditions)
+    print(f"过敏食物列表: {sorted(allergic_foods)}")
     filtered_foods = []
     for food in food_recommendations:
         print(f"检查食物: {food.food_name}, 过敏源: {food.allergens}")
-        if food.allergens:
-            food_allergens = [allergen.strip() for allergen in food.allergens.split(',')]
-            if any(allergen in allergic_foods for allergen in food_allergens):
-                print(f"食物 {food.food_name} 包含过敏源，被过滤掉")
-                continue
+        if not food.allergen_set.isdisjoint(allergic_foods):
+            print(f"食物 {food.food_name} 包含过敏源，被过滤掉")
+            continue
         filtered_foods.append(food)
         print(f"食物 {food.food_name} 通过过敏源检查")
 
     if not conditions:
         filtered_foods.sort(key=lambda x: x.calories, reverse=True)
+    return filtered_foods, condition_notes
 
+def _filter_meta(weather, fallback_weather_used, user_city, user_time, user_max_calories, conditions, condition_notes):
+    degrade_reason = g.get('degrade_reason')
     meta = {
         'weather': weather,
         'fallback_weather_used': fallback_weather_used,
         'city': user_city,
         'time': user_time,
         'max_calories': user_max_calories,
-        'health_condition': health_condition,
-        'condition_notes': condition_notes
+        'health_condition': ','.join(conditions),
+        'condition_notes': condition_notes,
+        'degraded': bool(degrade_reason)
     }
+    if degrade_reason:
+        meta['degrade_reason'] = degrade_reason
+    return meta
+
+def _filter_foods_for_user(user_id: int, user_time: str, user_city: str, user_max_calories: int, condition_override: str = None):
+    user, err = _get_user_or_error(user_id)
+    if err:
+        return None, err, None
+
+    conditions, allergic_foods = _user_health_profile(user, condition_override)
+    degrade_reason = g.get('degrade_reason')
+    weather, fallback_weather_used = _resolve_request_weather(user_city)
+
+    matching_weathers = weather_mapping.get(weather, [weather])
+    print(f"天气: {weather}, 匹配的天气条件: {matching_weathers}")
+
+    from sqlalchemy import or_
+    weather_conditions = [Food.weather_conditions.like(f'%{w}%') for w in matching_weathers]
+    print(f"天气条件查询: {weather_conditions}")
+
+    cache_key = (user_time, weather, user_max_calories)
+    food_recommendations = _cached_candidates(cache_key) if degrade_reason else None
+    if food_recommendations is None:
+        food_recommendations = _query_food_records(
+            Food.recommend_time == user_time,
+            or_(*weather_conditions),
+            Food.calories <= user_max_calories
+        )
+        print(f"天气条件筛选后: {[food.food_name for food in food_recommendations]}")
+
+        if not food_recommendations:
+            print("天气条件筛选结果为空，放宽天气限制")
+            food_recommendations = _query_food_records(
+                Food.recommend_time == user_time,
+                Food.calories <= user_max_calories
+            )
+            print(f"放宽天气限制后: {[food.food_name for food in food_recommendations]}")
+        _store_candidates(cache_key, food_recommendations)
+    else:
+        print(f"降级模式（{degrade_reason}），使用缓存的候选列表")
+    print(f"初始食物推荐: {[food.food_name for food in food_recommendations]}")
+
+    filtered_foods, condition_notes = _finish_filtering(food_recommendations, conditions, allergic_foods)
+    meta = _filter_meta(weather, fallback_weather_used, user_city, user_time, user_max_calories, conditions, condition_notes)
     return filtered_foods, None, meta
 
+def _weather_matches(food: 'FoodRecord', patterns):
+    # 与 SQL 中 weather_conditions LIKE '%w%' 一致：子串匹配，ASCII 不区分大小写
+    text_value = (food.weather_conditions or '').lower()
+    return any(p in text_value for p in patterns)
+
+def _filter_foods_for_day(user_id: int, user_times, user_city: str, user_max_calories: int, condition_override: str = None):
+    """
+    一次完成多个时段的筛选：用户和天气只解析一次，所有时段用一条 recommend_time IN (...) 查询取出，
+    在内存中按时段分区并做天气匹配（为空时同样放宽天气）。
+    健康状况筛选的"收窄后为空则保留"依赖各时段自己的候选，因此仍按时段分别执行。
+    返回 ({时段: (候选列表, meta)}, err)
+    """
+    user, err = _get_user_or_error(user_id)
+    if err:
+        return None, err
+
+    conditions, allergic_foods = _user_health_profile(user, condition_override)
+    degrade_reason = g.get('degrade_reason')
+    weather, fallback_weather_used = _resolve_request_weather(user_city)
+    matching_weathers = weather_mapping.get(weather, [weather])
+    print(f"天气: {weather}, 匹配的天气条件: {matching_weathers}")
+
+    partitions = {}
+    if degrade_reason:
+        for user_time in user_times:
+            cached = _cached_candidates((user_time, weather, user_max_calories))
+            if cached is not None:
+                partitions[user_time] = cached
+        if partitions:
+            print(f"降级模式（{degrade_reason}），使用缓存的候选列表: {list(partitions)}")
+
+    missing = [t for t in user_times if t not in partitions]
+    if missing:
+        scanned = {t: [] for t in missing}
+        for food in _query_food_records(Food.recommend_time.in_(missing), Food.calories <= user_max_calories):
+            scanned[food.recommend_time].append(food)
+        patterns = [w.lower() for w in matching_weathers]
+        for user_time, slot_foods in scanned.items():
+            matched = [food for food in slot_foods if _weather_matches(food, patterns)]
+            if not matched:
+                print(f"{user_time} 天气条件筛选结果为空，放宽天气限制")
+                matched = slot_foods
+            _store_candidates((user_time, weather, user_max_calories), matched)
+            partitions[user_time] = matched
+
+    result = {}
+    for user_time in user_times:
+        filtered_foods, condition_notes = _finish_filtering(partitions[user_time], conditions, allergic_foods)
+        meta = _filter_meta(weather, fallback_weather_used, user_city, user_time, user_max_calories, conditions, condition_notes)
+        result[user_time] = (filtered_foods, meta)
+    return result, None
+
+# 按需剖析接下来 N 个匹配路由/参数的请求；未开启时 _profile_plan 为 None，请求路径上只有一次判断
+_profile_lock = threading.Lock()
+_profile_plan = None  # {'route', 'params', 'remaining', 'mode', 'interval', 'tracemalloc'}
+_profile_results = deque(maxlen=20)
+_profile_active = False  # 同一时刻只剖析一个请求：3.12+ 的 cProfile 作用于整个解释器，且不能重复开启
+_tracemalloc_users = 0  # 由剖析会话开启的 tracemalloc 引用计数，最后一个会话结束时才停止
+_PROFILE_TARGETS = ('_filter_foods_for_user', 'recommend_meal', '_filter_foods_for_day', 'recommend_day')
+
+def _profile_line_ranges():
+    ranges = {}
+    for name in _PROFILE_TARGETS:
+        fn = inspect.unwrap(globals()[name])
+        lines, start = inspect.getsourcelines(fn)
+        ranges[name] = (start, start + len(lines) - 1)
+    return ranges
+
+def _collapse_stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+def _sample_thread(session):
+    # 定时采样被剖析线程的调用栈，输出 collapsed stacks（可直接交给 flamegraph.pl / speedscope）
+    target = session['thread_id']
+    counts = session['stacks']
+    while not session['stop'].wait(session['interval']):
+        frame = sys._current_frames().get(target)
+        if frame is not None:
+            stack = _collapse_stack(frame)
+            counts[stack] = counts.get(stack, 0) + 1
+
+def _tracemalloc_summary(snapshot, label: str):
+    """按 _PROFILE_TARGETS 中各函数的源码行范围归集仍存活的分配（含其调用的函数）"""
+    app_file = _filter_foods_for_user.__code__.co_filename
+    ranges = _profile_line_ranges()
+    by_target = {name: {'size_bytes': 0, 'count': 0} for name in ranges}
+    by_line = {}
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(True, app_file, all_frames=True)])
+    for trace in snapshot.traces:
+        matched = set()
+        # traceback 从最外层到最内层排列；倒序遍历，使每个函数归属到它最内层的那一行
+        for frame in reversed(list(trace.traceback)):
+            if frame.filename != app_file:
+                continue
+            for name, (lo, hi) in ranges.items():
+                if name not in matched and lo <= frame.lineno <= hi:
+                    matched.add(name)
+                    by_target[name]['size_bytes'] += trace.size
+                    by_target[name]['count'] += 1
+                    key = f"{name}:{frame.lineno}"
+                    by_line[key] = by_line.get(key, 0) + trace.size
+    top_lines = sorted(by_line.items(), key=lambda kv: kv[1], reverse=True)[:15]
+    return {'label': label, 'targets': by_target, 'top_lines': [{'line': k, 'size_bytes': v} for k, v in top_lines]}
+
+@app.before_request
+def _maybe_start_profile():
+    global _profile_plan
+    if _profile_plan is None:
+        return
+    global _profile_active
+    with _profile_lock:
+        plan = _profile_plan
+        # 已有请求在剖析时跳过，计划保持不变，由后续匹配的请求补上
+        if plan is None or _profile_active or request.path != plan['route']:
+            return
+        if any(request.args.get(k) != v for k, v in plan['params'].items()):
+            return
+        plan['remaining'] -= 1
+        if plan['remaining'] <= 0:
+            _profile_plan = None
+        _profile_active = True
+
+    session = {
+        'mode': plan['mode'],
+        'path': request.path,
+        'query': request.query_string.decode('utf-8', 'replace'),
+        'started': time.perf_counter(),
+        'tracemalloc': plan['tracemalloc'],
+        'snapshots': []
+    }
+    try:
+        if plan['tracemalloc']:
+            session['tracemalloc_acquired'] = _acquire_tracemalloc()
+            tracemalloc.reset_peak()
+        if plan['mode'] == 'sample':
+            session.update(thread_id=threading.get_ident(), interval=plan['interval'], stacks={}, stop=threading.Event())
+            session['sampler'] = threading.Thread(target=_sample_thread, args=(session,), daemon=True)
+            session['sampler'].start()
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            session['profiler'] = profiler
+    except ValueError as e:
+        # 3.12+ 上若已有其他剖析工具（调试器、外部 profiler）占用，enable() 会抛 ValueError；跳过剖析，不影响请求
+        print(f"无法开启剖析，跳过本次请求: {e}")
+        _release_profile(session)
+        return
+    g.profile_session = session
+
+def _acquire_tracemalloc():
+    # 外部已开启的 tracemalloc（如 PYTHONTRACEMALLOC）不计数，也不会被剖析会话停止
+    global _tracemalloc_users
+    with _profile_lock:
+        if _tracemalloc_users == 0:
+            if tracemalloc.is_tracing():
+                return False
+            tracemalloc.start(25)
+        _tracemalloc_users += 1
+        return True
+
+def _release_profile(session):
+    global _tracemalloc_users, _profile_active
+    with _profile_lock:
+        if session.pop('tracemalloc_acquired', False):
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0:
+                tracemalloc.stop()
+        _profile_active = False
+
+def _profile_checkpoint(label: str):
+    # 在 _filter_foods_for_user 返回后记录一次分配快照
+    session = g.profile_session
+    if session['tracemalloc'] and tracemalloc.is_tracing():
+        session['snapshots'].append((label, tracemalloc.take_snapshot()))
+
+@app.teardown_request
+def _finish_profile(exc):
+    session = g.pop('profile_session', None)
+    if session is None:
+        return
+    result = {
+        'mode': session['mode'],
+        'path': session['path'],
+        'query': session['query'],
+        'elapsed_ms': round((time.perf_counter() - session['started']) * 1000, 2)
+    }
+    try:
+        if 'profiler' in session:
+            session['profiler'].disable()
+        else:
+            session['stop'].set()
+            session['sampler'].join()
+        if session['tracemalloc'] and tracemalloc.is_tracing():
+            session['snapshots'].append(('request_end', tracemalloc.take_snapshot()))
+            result['tracemalloc_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+    finally:
+        _release_profile(session)  # 先停止跟踪再汇总，否则汇总本身的分配也会被逐个记录
+
+    if 'profiler' in session:
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(session['profiler'], stream=out).sort_stats('cumulative').print_stats(40)
+        result['pstats'] = out.getvalue()
+    else:
+        result['collapsed'] = '\n'.join(f"{stack} {n}" for stack, n in sorted(session['stacks'].items()))
+    if session['snapshots']:
+        result['tracemalloc'] = [_tracemalloc_summary(snapshot, label) for label, snapshot in session['snapshots']]
+    _profile_results.append(result)
+
+EVENT_WEIGHTS = {'accept': 1.0, 'swap': 1.0, 'reject': -1.0}
+SWAP_FROM_WEIGHT = -0.5
+AFFINITY_LIMIT = 5.0
+
+_event_lock = threading.Lock()
+_event_buffer = deque(maxlen=EVENT_BUFFER_SIZE)
+_event_stats = {'accepted': 0, 'dropped': 0, 'flushed': 0, 'flushes': 0, 'last_flush_ms': 0.0}
+_last_event_flush = time.monotonic()
+_event_flusher = None
+_event_flush_wakeup = threading.Event()
+
+# 偏好分：_affinity 只保存已从数据库加载过的用户；未落库的增量先记在 _pending_affinity
+_affinity_flush_lock = threading.RLock()
+_affinity = {}  # user_id -> {food_id: score}
+_affinity_loaded_at = {}  # user_id -> 上次从数据库加载的时间
+_pending_affinity = {}  # (user_id, food_id) -> delta，等待下一次落库
+_inflight_affinity = {}  # 正在落库的增量
+
+def _parse_event_id(value):
+    # 只接受整数或纯数字字符串；int() 会把 1.7、true 之类的值悄悄转换成 ID
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    raise ValueError(value)
+
+def _parse_event(raw):
+    if not isinstance(raw, dict):
+        return None
+    event_type = raw.get('type')
+    if not isinstance(event_type, str) or event_type not in EVENT_WEIGHTS:
+        return None
+    try:
+        user_id = _parse_event_id(raw['user_id'])
+        food_id = _parse_event_id(raw['food_id'])
+        from_food_id = _parse_event_id(raw['from_food_id']) if raw.get('from_food_id') is not None else None
+    except (KeyError, ValueError):
+        return None
+    return (user_id, food_id, event_type, from_food_id, time.time())
+
+def _affinity_deltas(event):
+    user_id, food_id, event_type, from_food_id, _ts = event
+    yield (user_id, food_id), EVENT_WEIGHTS[event_type]
+    if event_type == 'swap' and from_food_id is not None:
+        yield (user_id, from_food_id), SWAP_FROM_WEIGHT
+
+def _ingest_events(events):
+    """追加到环形缓冲区并立即更新内存中的偏好分；缓冲区满时丢弃最旧的事件"""
+    with _event_lock:
+        for event in events:
+            if len(_event_buffer) == _event_buffer.maxlen:
+                _event_stats['dropped'] += 1
+            _event_buffer.append(event)
+            for key, delta in _affinity_deltas(event):
+                _pending_affinity[key] = _pending_affinity.get(key, 0.0) + delta
+                scores = _affinity.get(key[0])
+                if scores is not None:
+                    scores[key[1]] = scores.get(key[1], 0.0) + delta
+        _event_stats['accepted'] += len(events)
+        size_due = len(_event_buffer) >= EVENT_FLUSH_BATCH
+        time_due = time.monotonic() - _last_event_flush >= EVENT_FLUSH_INTERVAL
+    if _ensure_event_flusher():
+        # 后台线程每 EVENT_FLUSH_INTERVAL 秒落库一次，攒够一批时提前唤醒
+        if size_due:
+            _event_flush_wakeup.set()
+    elif size_due or time_due:
+        _flush_events()
+
+def _flush_events():
+    """把缓冲区中的事件和偏好分增量在一个事务内批量写入 SQLite"""
+    global _last_event_flush, _pending_affinity, _inflight_affinity
+    with _affinity_flush_lock:
+        with _event_lock:
+            batch = list(_event_buffer)
+            _event_buffer.clear()
+            deltas, _pending_affinity = _pending_affinity, {}
+            _last_event_flush = time.monotonic()
+        if not batch and not deltas:
+            return 0
+
+        _inflight_affinity = deltas
+        started = time.perf_counter()
+        try:
+            with app.app_context():
+                if batch:
+                    db.session.execute(FoodEvent.__table__.insert(), [
+                        {'user_id': u, 'food_id': f, 'event_type': t, 'from_food_id': ff, 'created_at': ts}
+                        for u, f, t, ff, ts in batch
+                    ])
+                if deltas:
+                    stmt = sqlite_insert(FoodAffinity.__table__)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['user_id', 'food_id'],
+                        set_={'score': FoodAffinity.__table__.c.score + stmt.excluded.score}
+                    )
+                    db.session.execute(stmt, [
+                        {'user_id': u, 'food_id': f, 'score': delta} for (u, f), delta in deltas.items()
+                    ])
+                db.session.commit()
+        except Exception as e:
+            # 落库失败时把增量放回，事件本身只在内存里，丢弃并计数
+            print(f"事件落库失败: {e}")
+            with _event_lock:
+                for key, delta in deltas.items():
+                    _pending_affinity[key] = _pending_affinity.get(key, 0.0) + delta
+                _event_stats['dropped'] += len(batch)
+            return 0
+        finally:
+            _inflight_affinity = {}
+
+        with _event_lock:
+            _event_stats['flushed'] += len(batch)
+            _event_stats['flushes'] += 1
+            _event_stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        return len(batch)
+
+def _event_flush_loop():
+    while True:
+        _event_flush_wakeup.wait(EVENT_FLUSH_INTERVAL)
+        _event_flush_wakeup.clear()
+        try:
+            _flush_events()
+        except Exception as e:
+            print(f"事件落库线程异常: {e}")
+
+def _ensure_event_flusher():
+    # 无服务器环境下在请求内同步落库
+    global _event_flusher
+    if _is_serverless:
+        return False
+    if _event_flusher is None:
+        with _event_lock:
+            if _event_flusher is None:
+                _event_flusher = threading.Thread(target=_event_flush_loop, name='event-flush', daemon=True)
+                _event_flusher.start()
+    return True
+
+atexit.register(_flush_events)
+
+def _get_affinity(user_id: int):
+    """
+    返回 {food_id: 偏好分}；首次访问或缓存超过 AFFINITY_TTL 时从数据库重新加载并合并本进程未落库的增量，
+    其他 worker 落库的事件因此最多延迟 AFFINITY_TTL 秒可见
+    """
+    scores = _affinity.get(user_id)
+    if scores is not None and time.monotonic() - _affinity_loaded_at.get(user_id, 0.0) < AFFINITY_TTL:
+        return scores
+    with _affinity_flush_lock:
+        try:
+            rows = db.session.query(FoodAffinity.food_id, FoodAffinity.score).filter(FoodAffinity.user_id == user_id).all()
+        except Exception:
+            db.session.rollback()
+            rows = []
+        loaded = {food_id: float(score) for food_id, score in rows}
+        with _event_lock:
+            for pending in (_inflight_affinity, _pending_affinity):
+                for (u, f), delta in pending.items():
+                    if u == user_id:
+                        loaded[f] = loaded.get(f, 0.0) + delta
+            # 整体替换而不是原地修改，请求中已取到的旧字典不受影响
+            _affinity[user_id] = loaded
+            _affinity_loaded_at[user_id] = time.monotonic()
+            return loaded
+
 # 根据健康状况、过敏史、天气、时间和热量筛选食物
 @app.route('/recommend', methods=['GET'])
+@_admission_controlled('recommend')
+@_traffic_capture
 def recommend_food():
     user_id = request.args.get('user_id', type=int)
     if not user_id:
@@ -432,6 +1408,8 @@ def recommend_food():
     condition = request.args.get('condition')
 
     filtered_foods, err, _meta = _filter_foods_for_user(user_id, user_time, user_city, user_max_calories, condition_override=condition)
+    if 'profile_session' in g:
+        _profile_checkpoint('_filter_foods_for_user')
     if err:
         return err
 
@@ -441,31 +1419,23 @@ def recommend_food():
     recommended_food = [_food_to_dict(food) for food in filtered_foods]
     return jsonify({'recommendations': recommended_food, 'message': ''})
 
-@app.route('/recommend/meal', methods=['GET'])
-def recommend_meal():
-    user_id = request.args.get('user_id', type=int)
-    if not user_id:
-        return jsonify({'error': '缺少用户ID参数'}), 400
-
-    user_time = request.args.get('time')
-    if not user_time:
-        return jsonify({'error': '缺少时间参数'}), 400
-
-    user_city = request.args.get('city', 'Beijing')
-    user_max_calories = request.args.get('max_calories', 500, type=int)
-    condition = request.args.get('condition')
+_MEAL_SLOT_NAMES = {'staple': '主食', 'protein': '蛋白', 'vegetable': '蔬菜'}
 
-    foods, err, meta = _filter_foods_for_user(user_id, user_time, user_city, user_max_calories, condition_override=condition)
-    if err:
-        return err
+_BUDGET_SHORTFALL_MESSAGE = '热量预算不足，未能安排本餐'
 
+def _compose_meal(foods, user_id: int, meta: dict, affinity: dict, calorie_budget: int = None):
+    """
+    从筛选后的候选中按 主食/蛋白/蔬菜 各选一个组成一餐，返回 /recommend/meal 的响应体；
+    给定 calorie_budget 时，三样的热量合计不超过预算（为后面的类别预留最低热量），备选也只列换上后不超预算的
+    """
+    empty = {
+        'meal': None,
+        'alternatives': {'staple': [], 'protein': [], 'vegetable': []},
+        'meta': meta,
+        'message': '没有找到符合条件的食物'
+    }
     if not foods:
-        return jsonify({
-            'meal': None,
-            'alternatives': {'staple': [], 'protein': [], 'vegetable': []},
-            'meta': meta,
-            'message': '没有找到符合条件的食物'
-        }), 200
+        return empty
 
     allowed_types = {'主食': 'staple', '蛋白': 'protein', '蔬菜': 'vegetable'}
     categorized = {'staple': [], 'protein': [], 'vegetable': [], 'other': []}
@@ -478,51 +1448,73 @@ def recommend_meal():
 
     recent_ids = _get_recent_ids(user_id)
 
-    def score(food: 'Food'):
+    def score(food: 'FoodRecord'):
         base = food.calories
         if food.id in recent_ids:
             base -= 10000
+        preference = affinity.get(food.id)
+        if preference:
+            base += max(-AFFINITY_LIMIT, min(AFFINITY_LIMIT, preference)) * AFFINITY_WEIGHT
         return base
 
-    def pick_one(bucket_key: str, used_ids: set):
+    def bucket_candidates(bucket_key: str, used_ids: set):
         bucket = categorized[bucket_key]
         if not bucket:
             bucket = categorized['other']
-        candidates = [f for f in bucket if f.id not in used_ids]
+        return [f for f in bucket if f.id not in used_ids]
+
+    def pick_one(bucket_key: str, used_ids: set, limit: int = None):
+        candidates = bucket_candidates(bucket_key, used_ids)
+        if limit is not None:
+            candidates = [f for f in candidates if f.calories <= limit]
         candidates = sorted(candidates, key=score, reverse=True)
         return candidates[0] if candidates else None
 
+    order = ('staple', 'protein', 'vegetable')
+    selected = {}
+    skipped = []
     used_ids = set()
-    staple = pick_one('staple', used_ids)
-    if staple:
-        used_ids.add(staple.id)
-
-    protein = pick_one('protein', used_ids)
-    if protein:
-        used_ids.add(protein.id)
-
-    vegetable = pick_one('vegetable', used_ids)
-    if vegetable:
-        used_ids.add(vegetable.id)
+    remaining = calorie_budget
+    for i, bucket_key in enumerate(order):
+        if remaining is None:
+            food = pick_one(bucket_key, used_ids)
+        else:
+            # 为后面的类别预留各自最低的热量，避免前面选得太满；实在放不下时再取消预留
+            reserve = 0
+            for later in order[i + 1:]:
+                later_calories = [f.calories for f in bucket_candidates(later, used_ids)]
+                if later_calories:
+                    reserve += min(later_calories)
+            food = pick_one(bucket_key, used_ids, remaining - reserve) or pick_one(bucket_key, used_ids, remaining)
+            if food is None and bucket_candidates(bucket_key, used_ids):
+                skipped.append(bucket_key)
+        selected[bucket_key] = food
+        if food:
+            used_ids.add(food.id)
+            if remaining is not None:
+                remaining -= food.calories
+    staple, protein, vegetable = selected['staple'], selected['protein'], selected['vegetable']
 
     picked = [f for f in [staple, protein, vegetable] if f]
     if not picked:
-        return jsonify({
-            'meal': None,
-            'alternatives': {'staple': [], 'protein': [], 'vegetable': []},
-            'meta': meta,
-            'message': '没有找到符合条件的食物'
-        }), 200
+        if skipped:
+            # 有候选但都超出本餐预算，和"没有符合条件的食物"区分开
+            return dict(empty, message=_BUDGET_SHORTFALL_MESSAGE)
+        return empty
 
     _record_recommended_ids(user_id, [f.id for f in picked])
 
-    def build_alternatives(bucket_key: str, selected_food: 'Food', excluded_ids: set):
+    def build_alternatives(bucket_key: str, selected_food: 'FoodRecord', excluded_ids: set):
         bucket = categorized[bucket_key] if categorized[bucket_key] else categorized['other']
+        limit = None
+        if remaining is not None:
+            limit = remaining + (selected_food.calories if selected_food else 0)
         candidates = [
             f for f in bucket
             if (
                 (not selected_food or f.id != selected_food.id)
                 and (f.id not in excluded_ids)
+                and (limit is None or f.calories <= limit)
             )
         ]
         candidates = sorted(candidates, key=score, reverse=True)
@@ -545,20 +1537,26 @@ def recommend_meal():
     }
 
     explanations = [
-        f"推荐时段：{user_time}",
-        f"城市：{user_city}",
-        f"最大热量：{user_max_calories}"
+        f"推荐时段：{meta.get('time')}",
+        f"城市：{meta.get('city')}",
+        f"最大热量：{meta.get('max_calories')}"
     ]
+    if calorie_budget is not None:
+        explanations.append(f"本餐热量预算：{calorie_budget}")
     warnings = []
     if meta and meta.get('health_condition'):
         explanations.append(f"健康状况：{meta.get('health_condition')}")
         notes = meta.get('condition_notes')
         if isinstance(notes, list) and notes:
             warnings.extend([str(x) for x in notes if x])
-    if meta and meta.get('fallback_weather_used'):
+    if meta and meta.get('degraded'):
+        warnings.append('服务繁忙，已跳过实时天气并使用缓存的推荐候选')
+    elif meta and meta.get('fallback_weather_used'):
         warnings.append('天气服务不可用，已使用默认天气策略')
     elif meta and meta.get('weather'):
         explanations.append(f"天气：{meta.get('weather')}")
+    if skipped:
+        warnings.append(f"热量预算不足，未安排：{'、'.join(_MEAL_SLOT_NAMES[k] for k in skipped)}")
 
     meal = {
         'staple': _food_to_dict(staple) if staple else None,
@@ -566,39 +1564,319 @@ def recommend_meal():
         'vegetable': _food_to_dict(vegetable) if vegetable else None,
         'nutrition_total': {
             'calories': sum([f.calories for f in picked]),
-            'sugar_content': sum([float(f.sugar_content or 0) for f in picked])
+            'sugar_content': sum([f.sugar_content for f in picked])
         },
         'explanations': explanations,
         'warnings': warnings
     }
 
-    return jsonify({
+    return {
         'meal': meal,
         'alternatives': alternatives,
         'meta': meta,
         'message': ''
+    }
+
+@app.route('/recommend/meal', methods=['GET'])
+@_admission_controlled('recommend_meal')
+@_traffic_capture
+def recommend_meal():
+    user_id = request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify({'error': '缺少用户ID参数'}), 400
+
+    user_time = request.args.get('time')
+    if not user_time:
+        return jsonify({'error': '缺少时间参数'}), 400
+
+    user_city = request.args.get('city', 'Beijing')
+    user_max_calories = request.args.get('max_calories', 500, type=int)
+    condition = request.args.get('condition')
+
+    foods, err, meta = _filter_foods_for_user(user_id, user_time, user_city, user_max_calories, condition_override=condition)
+    if 'profile_session' in g:
+        _profile_checkpoint('_filter_foods_for_user')
+    if err:
+        return err
+
+    affinity = g.replay_affinity if 'replay_affinity' in g else _get_affinity(user_id)
+    return jsonify(_compose_meal(foods, user_id, meta, affinity)), 200
+
+# 一日三餐及每日热量预算的默认分配比例；前一餐没用完的预算顺延到下一餐
+DAY_MEAL_SHARES = (('早餐', 0.3), ('午餐', 0.4), ('晚餐', 0.3))
+
+@app.route('/recommend/day', methods=['GET'])
+@_admission_controlled('recommend_day')
+@_traffic_capture
+def recommend_day():
+    user_id = request.args.get('user_id', type=int)
+    if not user_id:
+        return jsonify({'error': '缺少用户ID参数'}), 400
+
+    user_city = request.args.get('city', 'Beijing')
+    user_max_calories = request.args.get('max_calories', 500, type=int)
+    condition = request.args.get('condition')
+    daily_calories = request.args.get('daily_calories', type=int)
+    if daily_calories is not None and daily_calories <= 0:
+        return jsonify({'error': '每日热量预算必须为正数'}), 400
+
+    user_times = [slot for slot, _share in DAY_MEAL_SHARES]
+    slots, err = _filter_foods_for_day(user_id, user_times, user_city, user_max_calories, condition_override=condition)
+    if 'profile_session' in g:
+        _profile_checkpoint('_filter_foods_for_day')
+    if err:
+        return err
+
+    affinity = g.replay_affinity if 'replay_affinity' in g else _get_affinity(user_id)
+    plan = []  # 按早餐、午餐、晚餐排列；jsonify 会对对象的键排序，因此不用以时段为键的字典
+    consumed = 0
+    carry = 0
+    total_sugar = 0
+    for i, (user_time, share) in enumerate(DAY_MEAL_SHARES):
+        foods, meta = slots[user_time]
+        budget = None
+        if daily_calories is not None:
+            if i == len(DAY_MEAL_SHARES) - 1:
+                budget = daily_calories - consumed
+            else:
+                budget = int(daily_calories * share) + carry
+            meta['calorie_budget'] = budget
+        payload = _compose_meal(foods, user_id, meta, affinity, budget)
+        plan.append({'time': user_time, **payload})
+        meal_calories = payload['meal']['nutrition_total']['calories'] if payload['meal'] else 0
+        if payload['meal']:
+            total_sugar += payload['meal']['nutrition_total']['sugar_content']
+        consumed += meal_calories
+        if budget is not None:
+            carry = budget - meal_calories
+
+    message = ''
+    if not any(entry['meal'] for entry in plan):
+        if any(entry['message'] == _BUDGET_SHORTFALL_MESSAGE for entry in plan):
+            message = '热量预算不足，未能安排任何一餐'
+        else:
+            message = '没有找到符合条件的食物'
+    return jsonify({
+        'plan': plan,
+        'daily_calories': daily_calories,
+        'nutrition_total': {'calories': consumed, 'sugar_content': total_sugar},
+        'message': message
     }), 200
 
+@app.route('/events', methods=['POST'])
+@_admission_controlled('events')
+def ingest_events():
+    """
+    记录用户对推荐的反馈，支持单条、数组或 {"events": [...]}：
+    {"user_id": 1, "food_id": 12, "type": "accept" | "swap" | "reject", "from_food_id": 7}
+    单次最多 EVENT_MAX_PER_REQUEST 条，与推荐接口共用单客户端限流
+    """
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict) and 'events' in payload:
+        payload = payload['events']
+    raw_events = payload if isinstance(payload, list) else [payload]
+    if len(raw_events) > EVENT_MAX_PER_REQUEST:
+        return jsonify({'error': f'单次最多提交 {EVENT_MAX_PER_REQUEST} 条事件'}), 413
+    events = [_parse_event(raw) for raw in raw_events]
+    if not events or any(e is None for e in events):
+        return jsonify({'error': '事件格式错误：需要 user_id、food_id 和 type（accept/swap/reject）'}), 400
+    _ingest_events(events)
+    return jsonify({'accepted': len(events)}), 202
+
+@app.route('/debug/events')
+def debug_events():
+    # 事件缓冲区与落库计数
+    with _event_lock:
+        return jsonify(dict(_event_stats, buffered=len(_event_buffer), pending_affinity=len(_pending_affinity)))
+
+# 前端静态资源：把 index.html 中内联的 CSS/JS 拆成带内容哈希的文件，并预生成压缩版本
+_ASSET_SOURCE = 'index.html'
+_ASSET_DIST_DIR = os.path.join(app.static_folder, 'dist')
+_ASSET_MANIFEST = 'manifest.json'
+_ASSET_CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+}
+_INLINE_STYLE_RE = re.compile(r'<style>(.*?)</style>', re.S)
+_INLINE_SCRIPT_RE = re.compile(r'<script>(.*?)</script>', re.S)
+_asset_bundle = None
+
+def _asset_entry(name: str, data: bytes):
+    entry = {
+        'etag': hashlib.sha256(data).hexdigest()[:16],
+        'content_type': _ASSET_CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream'),
+        'identity': data,
+        'gzip': gzip.compress(data, compresslevel=9, mtime=0),
+    }
+    if brotli is not None:
+        entry['br'] = brotli.compress(data, quality=11)
+    return entry
+
+def _build_asset_bundle(source_html: str):
+    """
+    拆分内联 <style>/<script> 为 app.<hash>.css / app.<hash>.js，
+    返回 {文件名: {etag, content_type, identity, gzip[, br]}}
+    """
+    files = {}
+
+    def extract(body: str, ext: str):
+        data = body.encode('utf-8')
+        name = f"app.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        files[name] = data
+        return name
+
+    page = _INLINE_STYLE_RE.sub(
+        lambda m: f'<link rel="stylesheet" href="/assets/{extract(m.group(1), ".css")}">', source_html)
+    page = _INLINE_SCRIPT_RE.sub(
+        lambda m: f'<script src="/assets/{extract(m.group(1), ".js")}"></script>', page)
+    files[_ASSET_SOURCE] = page.encode('utf-8')
+
+    bundle = {name: _asset_entry(name, data) for name, data in files.items()}
+    bundle[_ASSET_MANIFEST] = {'source_sha256': hashlib.sha256(source_html.encode('utf-8')).hexdigest()}
+    return bundle
+
+def _write_asset_bundle(bundle, out_dir: str = _ASSET_DIST_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = dict(bundle[_ASSET_MANIFEST])
+    manifest['files'] = {}
+    for name, entry in bundle.items():
+        if name == _ASSET_MANIFEST:
+            continue
+        encodings = [enc for enc in ('identity', 'gzip', 'br') if enc in entry]
+        for enc in encodings:
+            suffix = {'identity': '', 'gzip': '.gz', 'br': '.br'}[enc]
+            with open(os.path.join(out_dir, name + suffix), 'wb') as fh:
+                fh.write(entry[enc])
+        manifest['files'][name] = {
+            'etag': entry['etag'],
+            'content_type': entry['content_type'],
+            'encodings': encodings,
+        }
+    with open(os.path.join(out_dir, _ASSET_MANIFEST), 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=2)
+
+def _read_asset_bundle(source_sha256: str, out_dir: str = _ASSET_DIST_DIR):
+    # 构建产物与当前 index.html 不一致（或不存在）时返回 None
+    try:
+        with open(os.path.join(out_dir, _ASSET_MANIFEST), encoding='utf-8') as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('source_sha256') != source_sha256:
+        return None
+
+    bundle = {_ASSET_MANIFEST: {'source_sha256': source_sha256}}
+    try:
+        for name, info in manifest.get('files', {}).items():
+            entry = {'etag': info['etag'], 'content_type': info['content_type']}
+            for enc in info['encodings']:
+                suffix = {'identity': '', 'gzip': '.gz', 'br': '.br'}[enc]
+                with open(os.path.join(out_dir, name + suffix), 'rb') as fh:
+                    entry[enc] = fh.read()
+            bundle[name] = entry
+    except (OSError, KeyError):
+        return None
+    return bundle
+
+def _get_asset_bundle():
+    """
+    优先使用 `python app.py build-assets` 生成的 static/dist；
+    未构建或已过期时在内存中构建一次（例如 Vercel 上只读文件系统）
+    """
+    global _asset_bundle
+    if _asset_bundle is None:
+        with open(os.path.join(app.static_folder, _ASSET_SOURCE), encoding='utf-8') as fh:
+            source_html = fh.read()
+        source_sha256 = hashlib.sha256(source_html.encode('utf-8')).hexdigest()
+        _asset_bundle = _read_asset_bundle(source_sha256) or _build_asset_bundle(source_html)
+    return _asset_bundle
+
+def _negotiate_encoding(entry):
+    accepted = request.accept_encodings
+    best, best_q = 'identity', 0
+    for enc in ('br', 'gzip'):
+        q = accepted.quality(enc) if enc in entry else 0
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+def _serve_asset(name: str, immutable: bool):
+    entry = _get_asset_bundle().get(name)
+    if not entry or name == _ASSET_MANIFEST:
+        abort(404)
+    encoding = _negotiate_encoding(entry)
+    resp = Response(entry[encoding], content_type=entry['content_type'])
+    if encoding != 'identity':
+        resp.headers['Content-Encoding'] = encoding
+    resp.headers['Vary'] = 'Accept-Encoding'
+    resp.set_etag(f"{entry['etag']}-{encoding}")
+    if immutable:
+        # 文件名带内容哈希，内容变化即换名，可永久缓存
+        resp.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        # HTML 入口每次用 ETag 协商，回访用户只拿到 304
+        resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
 @app.route('/')
 def index():
     # 返回HTML界面
-    return app.send_static_file('index.html')
+    return _serve_asset(_ASSET_SOURCE, immutable=False)
+
+@app.route('/assets/<path:name>')
+def assets(name: str):
+    # 入口页面文件名不带哈希，只能经 / 以 no-cache 方式提供，否则会被当作 immutable 永久缓存
+    if name == _ASSET_SOURCE:
+        abort(404)
+    return _serve_asset(name, immutable=True)
 
 @app.route('/debug/foods')
 def debug_foods():
-    # 返回所有食物数据用于调试
-    foods = Food.query.all()
-    return jsonify([{
-        'id': food.id,
-        'food_name': food.food_name,
-        'calories': food.calories,
-        'sugar_content': food.sugar_content,
-        'food_type': food.food_type,
-        'recommend_time': food.recommend_time,
-        'weather_conditions': food.weather_conditions,
-        'allergens': food.allergens,
-        'image_url': getattr(food, 'image_url', None)
-    } for food in foods])
+    # 返回所有食物数据用于调试；序列化结果随目录版本缓存
+    payloads = _current_catalog()['payloads']
+    body = payloads.get('debug_foods')
+    if body is None:
+        body = jsonify([_food_to_dict(food) for food in _query_food_records()]).get_data()
+        payloads['debug_foods'] = body
+    return Response(body, mimetype='application/json')
+
+_CATALOG_EXPORT_TYPES = {
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+@app.route('/catalog/export')
+def catalog_export():
+    # 分块流式导出整个食物目录，format=arrow（默认，IPC 流）/ parquet / ndjson
+    fmt = request.args.get('format', 'arrow')
+    if fmt not in _CATALOG_EXPORT_TYPES:
+        return jsonify({'error': 'format 只支持 arrow / parquet / ndjson'}), 400
+    if fmt != 'ndjson' and catalog_io.pa is None:
+        return jsonify({'error': '服务端未安装 pyarrow，请使用 format=ndjson'}), 501
+    mimetype, ext = _CATALOG_EXPORT_TYPES[fmt]
+    resp = Response(stream_with_context(catalog_io.stream_catalog(db.session, Food, fmt)), mimetype=mimetype)
+    resp.headers['Content-Disposition'] = f'attachment; filename=foods.{ext}'
+    return resp
+
+@app.route('/debug/admission')
+def debug_admission():
+    # 导出准入控制的计数（放行/降级/限流/过载拒绝）和当前并发
+    with _admission_lock:
+        return jsonify({
+            'routes': {k: dict(v) for k, v in _admission_stats.items()},
+            'in_flight': dict(_route_in_flight),
+            'weather_slow': time.monotonic() < _weather_slow_until,
+            'catalog_version': _catalog_state['version'],
+            'candidate_cache_size': len(_catalog_state['candidates']),
+            'limits': {
+                'rate_per_sec': RATE_LIMIT_PER_SEC,
+                'burst': RATE_LIMIT_BURST,
+                'max_concurrency': ROUTE_MAX_CONCURRENCY,
+                'degrade_concurrency': ROUTE_DEGRADE_CONCURRENCY
+            }
+        })
 
 @app.route('/food_image/<int:food_id>')
 def food_image(food_id: int):
@@ -632,6 +1910,89 @@ def debug_weather():
             'message': '使用默认天气: 晴天'
         })
 
+@app.route('/debug/weather_cache')
+def debug_weather_cache():
+    # 查看天气缓存和预取线程跟踪的活跃城市
+    now = time.monotonic()
+    with _weather_lock:
+        cities = {
+            key: {
+                'city': entry['city'],
+                'weather': entry['weather'],
+                'age_seconds': round(now - entry['fetched_at'], 1),
+                'city_id': entry['city_id'],
+                'failures': entry['failures'],
+                'retry_in_seconds': round(max(0.0, entry['next_attempt_at'] - now), 1)
+            }
+            for key, entry in _weather_cache.items()
+        }
+        activity = {key: round(_decayed(a, now), 3) for key, a in _city_activity.items()}
+    return jsonify({
+        'prefetch_enabled': WEATHER_PREFETCH_ENABLED,
+        'prefetch_running': _weather_prefetcher is not None,
+        'upstream_paused_seconds': round(max(0.0, _weather_paused_until - now), 1),
+        'ttl_seconds': WEATHER_CACHE_TTL,
+        'cities': cities,
+        'activity': activity
+    })
+
+def _check_admin_token():
+    if not PROFILE_TOKEN:
+        abort(404)
+    token = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(token.encode('utf-8'), PROFILE_TOKEN.encode('utf-8')):
+        abort(403)
+
+@app.route('/admin/profile', methods=['POST'])
+def admin_profile_start():
+    """
+    开启剖析：{"route": "/recommend/meal", "params": {"time": "午餐"}, "count": 5,
+              "mode": "cprofile" | "sample", "interval_ms": 2, "tracemalloc": true}
+    """
+    global _profile_plan
+    _check_admin_token()
+    body = request.get_json(silent=True) or {}
+    mode = body.get('mode', 'cprofile')
+    if mode not in ('cprofile', 'sample'):
+        return jsonify({'error': 'mode 只支持 cprofile 或 sample'}), 400
+    try:
+        count = max(1, min(100, int(body.get('count', 1))))
+        interval = max(0.5, float(body.get('interval_ms', 2))) / 1000
+    except (TypeError, ValueError):
+        return jsonify({'error': 'count / interval_ms 必须是数字'}), 400
+    plan = {
+        'route': str(body.get('route') or '/recommend/meal'),
+        'params': {str(k): str(v) for k, v in (body.get('params') or {}).items()},
+        'remaining': count,
+        'mode': mode,
+        'interval': interval,
+        'tracemalloc': bool(body.get('tracemalloc', False))
+    }
+    with _profile_lock:
+        _profile_plan = plan
+    return jsonify({'armed': plan}), 202
+
+@app.route('/admin/profile', methods=['GET'])
+def admin_profile_results():
+    # format=collapsed 时返回最近一次采样的 collapsed stacks 纯文本
+    _check_admin_token()
+    results = list(_profile_results)
+    if request.args.get('format') == 'collapsed':
+        sampled = [r for r in results if 'collapsed' in r]
+        return Response(sampled[-1]['collapsed'] if sampled else '', mimetype='text/plain')
+    with _profile_lock:
+        plan = dict(_profile_plan) if _profile_plan else None
+    return jsonify({'armed': plan, 'results': results})
+
+@app.route('/admin/profile', methods=['DELETE'])
+def admin_profile_stop():
+    global _profile_plan
+    _check_admin_token()
+    with _profile_lock:
+        _profile_plan = None
+        _profile_results.clear()
+    return jsonify({'armed': None})
+
 @app.route('/api/verify_weather', methods=['GET'])
 def api_verify_weather():
     city = request.args.get('city', 'Beijing')
@@ -863,6 +2224,45 @@ if __name__ == '__main__':
             _ensure_food_image_column()
         initialize_data()
         print('数据初始化完成')
+    elif len(sys.argv) > 1 and sys.argv[1] in ('export', 'import'):
+        # python app.py export foods.parquet
+        # python app.py import foods.parquet [--replace] [--keep-ids]
+        def _catalog_usage(error=None):
+            if error:
+                print(f'错误: {error}')
+            print('用法: python app.py export <文件.parquet|.arrow|.feather>')
+            print('      python app.py import <文件.parquet|.arrow|.feather> [--replace] [--keep-ids]')
+            sys.exit(2)
+
+        if len(sys.argv) < 3 or sys.argv[2].startswith('--'):
+            _catalog_usage()
+        path = sys.argv[2]
+        started = time.perf_counter()
+        try:
+            with app.app_context():
+                db.create_all()
+                _ensure_food_image_column()
+                if sys.argv[1] == 'export':
+                    count = catalog_io.export_catalog(db.session, Food, path)
+                    print(f'已导出 {count} 条食物到 {path}')
+                else:
+                    count = catalog_io.import_catalog(db.session, Food, path, replace='--replace' in sys.argv,
+                                                      keep_ids='--keep-ids' in sys.argv, on_write=_mark_catalog_changed)
+                    print(f'已从 {path} 导入 {count} 条食物')
+        except (catalog_io.CatalogFormatError, RuntimeError, FileNotFoundError) as e:
+            # 扩展名不支持、缺少必填列、未安装 pyarrow 或导入文件不存在
+            _catalog_usage(e)
+        print(f'耗时 {time.perf_counter() - started:.2f}s')
+    elif len(sys.argv) > 1 and sys.argv[1] == 'build-assets':
+        with open(os.path.join(app.static_folder, _ASSET_SOURCE), encoding='utf-8') as fh:
+            bundle = _build_asset_bundle(fh.read())
+        _write_asset_bundle(bundle)
+        for name, entry in bundle.items():
+            if name == _ASSET_MANIFEST:
+                continue
+            sizes = ', '.join(f"{enc}={len(entry[enc])}" for enc in ('identity', 'gzip', 'br') if enc in entry)
+            print(f"{name}: {sizes}")
+        print(f'静态资源已生成到 {_ASSET_DIST_DIR}')
     else:
         with app.app_context():
             db.create_all()  # 创建数据库表
@@ -0,0 +1,80 @@
+"""
+对比推荐流程中两种食物行表示的内存占用和字段访问耗时：
+Session 跟踪的 Food ORM 实例 vs 批量列查询生成的 FoodRecord
+
+用法：
+    python bench_food_record.py              # 使用本地数据库（不存在时先初始化示例数据）
+    python bench_food_record.py --repeat 500
+"""
+import argparse
+import contextlib
+import gc
+import io
+import time
+import tracemalloc
+
+
+def measure_memory(load):
+    """返回 (结果, 每行分配字节数)；只统计 load 期间新分配且仍存活的内存"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        rows = load()
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return rows, (after - before) / max(1, len(rows))
+
+
+def measure_access(rows, read, repeat: int):
+    """遍历全部行读取推荐流程用到的字段，返回单次遍历的最短耗时（微秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for row in rows:
+            read(row)
+        best = min(best, time.perf_counter() - started)
+    return best * 1e6
+
+
+def read_orm(food):
+    # ORM 路径在筛选时需要逐次转换类型并拆分过敏源字符串
+    return (float(food.sugar_content or 0), int(food.calories or 0), food.food_type,
+            set(a.strip() for a in food.allergens.split(',')) if food.allergens else set())
+
+
+def read_record(food):
+    return (food.sugar_content, food.calories, food.food_type, food.allergen_set)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='FoodRecord 与 ORM 实例的内存/访问耗时对比')
+    parser.add_argument('--repeat', type=int, default=200, help='访问耗时取多少次遍历中的最短值')
+    args = parser.parse_args(argv)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app, db, Food, _ensure_food_image_column, _query_food_records, initialize_data
+        with app.app_context():
+            db.create_all()
+            _ensure_food_image_column()
+        initialize_data()
+
+    with app.app_context():
+        orm_rows, orm_bytes = measure_memory(lambda: Food.query.all())
+        db.session.expunge_all()
+        record_rows, record_bytes = measure_memory(_query_food_records)
+        orm_rows = Food.query.all()
+        orm_us = measure_access(orm_rows, read_orm, args.repeat)
+        record_us = measure_access(record_rows, read_record, args.repeat)
+
+    print(f"食物数: {len(record_rows)}")
+    print(f"{'':12}{'B/食物':>12}{'遍历(us)':>12}")
+    print(f"{'ORM':12}{orm_bytes:>12.0f}{orm_us:>12.1f}")
+    print(f"{'FoodRecord':12}{record_bytes:>12.0f}{record_us:>12.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
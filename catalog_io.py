@@ -0,0 +1,248 @@
+"""
+食物目录的列式导入导出：按批次流式读写 Parquet / Arrow IPC，
+内存占用只与批大小有关，与目录规模无关
+
+依赖可选的 pyarrow（pip install pyarrow）；未安装时仅 NDJSON 流式导出可用
+"""
+import io
+import json
+import os
+
+from sqlalchemy import delete, select
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖
+    pa = pc = pq = None
+
+BATCH_SIZE = 50000
+
+# (列名, 是否必填)
+CATALOG_COLUMNS = (
+    ('id', False),
+    ('food_name', True),
+    ('calories', True),
+    ('sugar_content', True),
+    ('food_type', True),
+    ('recommend_time', True),
+    ('weather_conditions', True),
+    ('allergens', False),
+    ('image_url', False),
+)
+
+FORMATS = {
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.arrows': 'arrow',
+    '.feather': 'arrow',
+}
+
+
+class CatalogFormatError(ValueError):
+    pass
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError('列式导入导出需要 pyarrow：pip install pyarrow')
+
+
+def catalog_schema():
+    _require_pyarrow()
+    return pa.schema([
+        ('id', pa.int64()),
+        ('food_name', pa.string()),
+        ('calories', pa.int64()),
+        ('sugar_content', pa.float64()),
+        ('food_type', pa.string()),
+        ('recommend_time', pa.string()),
+        ('weather_conditions', pa.string()),
+        ('allergens', pa.string()),
+        ('image_url', pa.string()),
+    ])
+
+
+def format_for_path(path: str, fmt: str = None):
+    if fmt:
+        if fmt not in ('parquet', 'arrow'):
+            raise CatalogFormatError(f'不支持的格式: {fmt}')
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise CatalogFormatError(f'无法从扩展名判断格式: {path}（支持 .parquet / .arrow / .arrows / .feather）')
+    return FORMATS[ext]
+
+
+def iter_catalog_rows(session, model, batch_size: int = BATCH_SIZE):
+    """
+    按 id 顺序分批读取目录，每批是行元组列表。按 id 键集分页，每批一次独立的短查询、取完即释放读锁，
+    慢速的下载客户端不会在整个传输期间阻塞写入（事件落库、目录更新）；
+    各批之间不是同一快照，导出期间的并发写入可能部分可见
+    """
+    table = model.__table__
+    id_column = table.c.id
+    stmt = select(*[table.c[name] for name, _required in CATALOG_COLUMNS]).order_by(id_column).limit(batch_size)
+    # 走 Core 连接而不是 ORM session.execute，省掉逐行的 ORM 结果处理
+    connection = session.connection()
+    last_id = None
+    while True:
+        page = stmt if last_id is None else stmt.where(id_column > last_id)
+        rows = connection.execute(page).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]  # CATALOG_COLUMNS 第一列是 id
+
+
+def iter_catalog_batches(session, model, batch_size: int = BATCH_SIZE):
+    schema = catalog_schema()
+    for rows in iter_catalog_rows(session, model, batch_size):
+        columns = list(zip(*rows))
+        arrays = [pa.array(col, type=field.type) for col, field in zip(columns, schema)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink(io.RawIOBase):
+    """收集写入的字节，供流式 HTTP 响应按块取走"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _open_writer(sink, fmt: str, stream: bool):
+    schema = catalog_schema()
+    if fmt == 'parquet':
+        return pq.ParquetWriter(sink, schema, compression='zstd')
+    # 文件用 IPC 文件格式（即 Feather v2，可随机访问），HTTP 用 IPC 流格式
+    return pa.ipc.new_stream(sink, schema) if stream else pa.ipc.new_file(sink, schema)
+
+
+def export_catalog(session, model, path: str, fmt: str = None, batch_size: int = BATCH_SIZE):
+    """把目录写入 Parquet 或 Arrow IPC 文件，返回导出的行数"""
+    fmt = format_for_path(path, fmt)
+    _require_pyarrow()
+    total = 0
+    with open(path, 'wb') as fh:
+        writer = _open_writer(fh, fmt, stream=False)
+        try:
+            for batch in iter_catalog_batches(session, model, batch_size):
+                writer.write_batch(batch)
+                total += batch.num_rows
+        finally:
+            writer.close()
+    return total
+
+
+def stream_catalog(session, model, fmt: str, batch_size: int = BATCH_SIZE):
+    """生成导出内容的字节块（arrow / parquet / ndjson），用于分块传输的 HTTP 响应"""
+    if fmt == 'ndjson':
+        names = [name for name, _required in CATALOG_COLUMNS]
+        for rows in iter_catalog_rows(session, model, batch_size):
+            yield ''.join(json.dumps(dict(zip(names, row)), ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+        return
+
+    _require_pyarrow()
+    sink = _ChunkSink()
+    writer = _open_writer(sink, fmt, stream=True)
+    for batch in iter_catalog_batches(session, model, batch_size):
+        writer.write_batch(batch)
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.drain()
+
+
+def _iter_file_batches(path: str, fmt: str, batch_size: int):
+    if fmt == 'parquet':
+        parquet_file = pq.ParquetFile(path)
+        available = set(parquet_file.schema_arrow.names)
+        _check_columns(available)
+        columns = [name for name, _required in CATALOG_COLUMNS if name in available]
+        yield from parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+        return
+
+    source = pa.memory_map(path, 'r')
+    try:
+        reader = pa.ipc.open_file(source)
+        _check_columns(set(reader.schema.names))
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+    except pa.ArrowInvalid:
+        # 不是 IPC 文件格式时按流格式读取
+        source.seek(0)
+        reader = pa.ipc.open_stream(source)
+        _check_columns(set(reader.schema.names))
+        yield from reader
+
+
+def _check_columns(available):
+    missing = [name for name, required in CATALOG_COLUMNS if required and name not in available]
+    if missing:
+        raise CatalogFormatError(f"缺少必填列: {', '.join(missing)}")
+
+
+def _batch_columns(batch, keep_ids: bool):
+    """返回 (列名列表, 行元组迭代器)，列按目录 schema 转换类型；文件中多余的列忽略"""
+    schema = catalog_schema()
+    names, columns = [], []
+    for name, _required in CATALOG_COLUMNS:
+        if name == 'id' and not keep_ids:
+            continue
+        idx = batch.schema.get_field_index(name)
+        if idx < 0:
+            continue
+        names.append(name)
+        columns.append(pc.cast(batch.column(idx), schema.field(name).type).to_pylist())
+    return names, zip(*columns)
+
+
+def import_catalog(session, model, path: str, fmt: str = None, batch_size: int = BATCH_SIZE,
+                   replace: bool = False, keep_ids: bool = False, on_write=None):
+    """
+    从 Parquet / Arrow IPC 文件按批导入目录，整个导入在一个事务内完成；
+    replace=True 时先清空现有食物，keep_ids=True 时沿用文件中的 id。
+    行数据直接交给驱动 executemany，不经过 ORM；on_write(session) 在提交前调用一次，
+    用于递增目录版本等
+    """
+    fmt = format_for_path(path, fmt)
+    _require_pyarrow()
+    table = model.__table__
+    connection = session.connection()
+    total = 0
+    try:
+        if replace:
+            connection.execute(delete(table))
+        for batch in _iter_file_batches(path, fmt, batch_size):
+            names, rows = _batch_columns(batch, keep_ids)
+            rows = list(rows)
+            if not rows:
+                continue
+            placeholders = ', '.join('?' for _ in names)  # sqlite3 驱动使用 qmark 参数风格
+            connection.exec_driver_sql(
+                f"INSERT INTO {table.name} ({', '.join(names)}) VALUES ({placeholders})", rows
+            )
+            total += len(rows)
+        if on_write is not None and (total or replace):
+            on_write(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return total
@@ -0,0 +1,126 @@
+"""
+回放 CAPTURE_LOG 录制的流量：固定录制时的天气、降级状态、推荐历史和偏好分重放请求，
+比较响应摘要是否一致，并输出与录制时的延迟对比
+
+用法：
+    python replay.py capture.jsonl                          # 进程内回放（使用本地数据库）
+    python replay.py capture.jsonl --url http://127.0.0.1:5000  # 回放到已启动的实例（需 REPLAY_MODE=1）
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+
+
+def load_records(path: str, limit: int = None):
+    records = []
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            records.append(json.loads(line))
+            if limit and len(records) >= limit:
+                break
+    return records
+
+
+def replay_headers(record):
+    return {
+        'X-Replay-Weather': json.dumps(record.get('weather')),
+        'X-Replay-History': json.dumps(record.get('history') or []),
+        'X-Replay-Affinity': json.dumps(record.get('affinity') or {}),
+        # 录制时处于降级模式的请求按同样的降级方式回放，其余请求强制不降级
+        'X-Replay-Degrade': json.dumps(record.get('degrade_reason')),
+    }
+
+
+def replay_in_process(records):
+    os.environ['REPLAY_MODE'] = '1'
+    import app as app_module
+    from app import app, db, _ensure_food_image_column, initialize_data
+
+    # 回放顺序执行，不应被限流或降级
+    app_module.REPLAY_MODE = True
+    app_module.CAPTURE_LOG = None
+    app_module.RATE_LIMIT_BURST = float('inf')
+    app_module.RATE_LIMIT_PER_SEC = float('inf')
+
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet):
+        with app.app_context():
+            db.create_all()
+            _ensure_food_image_column()
+        initialize_data()
+
+    client = app.test_client()
+    results = []
+    for record in records:
+        with contextlib.redirect_stdout(quiet):
+            started = time.perf_counter()
+            resp = client.get(record['path'], query_string=record['args'], headers=replay_headers(record))
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        quiet.seek(0)
+        quiet.truncate()
+        results.append((resp.status_code, hashlib.sha1(resp.get_data()).hexdigest(), elapsed_ms))
+    return results
+
+
+def replay_http(records, base_url: str):
+    import requests
+
+    session = requests.Session()
+    results = []
+    for record in records:
+        started = time.perf_counter()
+        resp = session.get(base_url.rstrip('/') + record['path'], params=record['args'],
+                           headers=replay_headers(record), timeout=30)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        results.append((resp.status_code, hashlib.sha1(resp.content).hexdigest(), elapsed_ms))
+    return results
+
+
+def percentile(values, p: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def report(records, results, show: int = 10):
+    mismatches = []
+    for record, (status, digest, _elapsed) in zip(records, results):
+        if status != record.get('status') or digest != record.get('digest'):
+            mismatches.append((record, status))
+
+    captured = [r['latency_ms'] for r in records if 'latency_ms' in r]
+    replayed = [elapsed for _status, _digest, elapsed in results]
+    print(f"回放请求: {len(records)}，输出一致: {len(records) - len(mismatches)}，不一致: {len(mismatches)}")
+    print(f"{'':6}{'录制(ms)':>12}{'回放(ms)':>12}{'差值(ms)':>12}")
+    for p in (50, 95, 99):
+        before, after = percentile(captured, p), percentile(replayed, p)
+        print(f"p{p:<5}{before:>12.2f}{after:>12.2f}{after - before:>+12.2f}")
+    for record, status in mismatches[:show]:
+        print(f"不一致: {record['path']} {record['args']} 状态码 {record.get('status')} -> {status}")
+    return not mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='回放录制的推荐请求，检查输出一致性和延迟变化')
+    parser.add_argument('capture', help='CAPTURE_LOG 生成的 JSONL 文件')
+    parser.add_argument('--url', help='回放到已启动的实例（需设置 REPLAY_MODE=1），默认进程内回放')
+    parser.add_argument('--limit', type=int, help='最多回放的请求数')
+    args = parser.parse_args(argv)
+
+    records = load_records(args.capture, args.limit)
+    results = replay_http(records, args.url) if args.url else replay_in_process(records)
+    return 0 if report(records, results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 必须在导入 app 之前设置：独立的临时数据库，不读取 .env 中的真实密钥，不启动后台预取
+_DB_DIR = tempfile.mkdtemp(prefix='foods-test-')
+os.environ['SQLITE_PATH'] = os.path.join(_DB_DIR, 'foods.db')
+os.environ['OPENWEATHER_API_KEY'] = ''
+os.environ['WEATHER_PREFETCH'] = '0'
+os.environ.pop('CAPTURE_LOG', None)
+os.environ.pop('PROFILE_TOKEN', None)
+os.environ.pop('REPLAY_MODE', None)
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app as app_module
+
+    with app_module.app.app_context():
+        app_module.db.create_all()
+        app_module._ensure_food_image_column()
+    app_module.initialize_data()
+    return app_module
+
+
+@pytest.fixture(autouse=True)
+def _reset_state(app_module):
+    # 每个用例从干净的进程内状态开始（数据库在整个会话内共享）
+    app_module.recent_recommendation_history.clear()
+    app_module._client_buckets.clear()
+    app_module._admission_stats.clear()
+    app_module._weather_cache.clear()
+    app_module._city_activity.clear()
+    app_module._weather_slow_until = 0.0
+    app_module._weather_paused_until = 0.0
+    yield
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture(scope='session')
+def live_server(app_module):
+    """多线程的真实 HTTP 服务，用于并发测试；返回基础 URL"""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
@@ -0,0 +1,115 @@
+"""
+假的 OpenWeatherMap 上游：实现 /weather?q= 和 /group?id=，记录每次调用，
+可设置延迟和强制返回的状态码。测试中把 OPENWEATHER_API_BASE 指向它；
+也可单独运行，供本地联调：python tests/fake_openweather.py --port 8081
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 城市名 -> (城市ID, 天气主信息)
+DEFAULT_CITIES = {
+    'Beijing': (1816670, 'Clear'),
+    'Shanghai': (1796236, 'Rain'),
+    'Guangzhou': (1809858, 'Clouds'),
+    'Chengdu': (1815286, 'Mist'),
+}
+
+
+class FakeOpenWeather:
+    def __init__(self, cities=None):
+        self.cities = dict(cities or DEFAULT_CITIES)
+        self.calls = []  # [(路径, 查询参数)]
+        self.delay = 0.0
+        self.status = 200  # 非 200 时所有请求直接返回该状态码
+        self.retry_after = None
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def start(self, port: int = 0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+        self.delay = 0.0
+        self.status = 200
+        self.retry_after = None
+
+    def paths(self):
+        with self._lock:
+            return [path for path, _params in self.calls]
+
+    def _handle(self, handler):
+        url = urlparse(handler.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path.rsplit('/', 1)[-1]
+        with self._lock:
+            self.calls.append((path, params))
+        if self.delay:
+            time.sleep(self.delay)
+
+        if self.status != 200:
+            headers = {'Retry-After': str(self.retry_after)} if self.retry_after is not None else {}
+            return self._reply(handler, self.status, {'cod': self.status, 'message': 'fake error'}, headers)
+        if path == 'weather':
+            found = self.cities.get(params.get('q'))
+            if not found:
+                return self._reply(handler, 404, {'cod': '404', 'message': 'city not found'})
+            return self._reply(handler, 200, self._city_payload(params['q'], *found))
+        if path == 'group':
+            wanted = {int(i) for i in params.get('id', '').split(',') if i}
+            items = [self._city_payload(name, city_id, main)
+                     for name, (city_id, main) in self.cities.items() if city_id in wanted]
+            return self._reply(handler, 200, {'cnt': len(items), 'list': items})
+        return self._reply(handler, 404, {'cod': '404', 'message': 'not found'})
+
+    @staticmethod
+    def _city_payload(name, city_id, main):
+        return {'id': city_id, 'name': name, 'weather': [{'main': main, 'description': main.lower()}]}
+
+    @staticmethod
+    def _reply(handler, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='假的 OpenWeatherMap 上游')
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+    fake = FakeOpenWeather().start(args.port)
+    print(f'OPENWEATHER_API_BASE={fake.base_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import requests
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def test_p99_bounded_at_twice_capacity(app_module, live_server, monkeypatch):
+    # 上游天气接口一次只处理 1 个请求、每个 200ms；不降级时准入的 4 个请求在上游排队，
+    # p99 约 4 * 200ms = 800ms。降级后只有 1 个请求等实时天气
+    capacity = 4
+    upstream = threading.Semaphore(1)
+
+    def slow_weather(city='Beijing'):
+        with upstream:
+            time.sleep(0.2)
+        return 'Clear'
+
+    monkeypatch.setattr(app_module, 'get_weather', slow_weather)
+    monkeypatch.setattr(app_module, 'ROUTE_MAX_CONCURRENCY', capacity)
+    monkeypatch.setattr(app_module, 'ROUTE_DEGRADE_CONCURRENCY', 1)
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_BURST', float('inf'))
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_PER_SEC', float('inf'))
+
+    latencies, statuses, degraded = [], [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + 2.0
+
+    def worker():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            resp = session.get(f'{live_server}/recommend/meal', params={'user_id': 1, 'time': '午餐'}, timeout=10)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(resp.status_code)
+                if resp.status_code == 200:
+                    degraded.append(resp.json()['meta']['degraded'])
+                else:
+                    assert resp.headers.get('Retry-After') == '1'
+
+    threads = [threading.Thread(target=worker) for _ in range(2 * capacity)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert set(statuses) <= {200, 503}
+    assert statuses.count(200) > 0
+    assert any(degraded)
+    assert _percentile(latencies, 99) < 0.5
+
+    stats = app_module._admission_stats['recommend_meal']
+    assert stats['admitted'] == statuses.count(200)
+    assert stats['shed_overloaded'] == statuses.count(503)
+    assert stats['degraded'] == sum(degraded)
+
+
+def test_rate_limit_ignores_spoofed_forwarded_for(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_BURST', 3)
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_PER_SEC', 0.001)
+
+    statuses = [
+        client.get('/recommend', query_string={'user_id': 1, 'time': '午餐'},
+                   headers={'X-Forwarded-For': f'10.0.0.{i}'}).status_code
+        for i in range(5)
+    ]
+    assert statuses == [200, 200, 200, 429, 429]
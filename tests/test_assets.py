@@ -0,0 +1,75 @@
+import functools
+import gzip
+import hashlib
+import re
+
+import pytest
+
+
+def _hashed_assets(body: bytes):
+    return re.findall(r'/assets/(app\.[0-9a-f]{12}\.(?:css|js))', body.decode('utf-8'))
+
+
+def test_gzip_and_identity_negotiation(client):
+    plain = client.get('/', headers={'Accept-Encoding': 'identity'})
+    assert plain.status_code == 200
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+
+    zipped = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.get_data()) == plain.get_data()
+
+    refused = client.get('/', headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in refused.headers
+    assert refused.get_data() == plain.get_data()
+
+
+def test_etag_revalidation_returns_304(client):
+    first = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    etag = first.headers['ETag']
+    again = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+
+    # 编码不同则 ETag 不同，不会把 gzip 的缓存当成明文
+    plain = client.get('/', headers={'Accept-Encoding': 'identity', 'If-None-Match': etag})
+    assert plain.status_code == 200
+
+
+def test_cache_control_for_entry_and_hashed_assets(client):
+    index = client.get('/')
+    assert index.headers['Cache-Control'] == 'no-cache'
+
+    names = _hashed_assets(index.get_data())
+    assert any(n.endswith('.css') for n in names) and any(n.endswith('.js') for n in names)
+    for name in names:
+        resp = client.get(f'/assets/{name}', headers={'Accept-Encoding': 'identity'})
+        assert resp.status_code == 200
+        assert 'immutable' in resp.headers['Cache-Control']
+        # 文件名中的哈希就是内容哈希
+        assert hashlib.sha256(resp.get_data()).hexdigest()[:12] == name.split('.')[1]
+
+
+@pytest.mark.parametrize('name', ['manifest.json', 'index.html', 'missing.js'])
+def test_non_hashed_names_are_not_served_from_assets(client, name):
+    assert client.get(f'/assets/{name}').status_code == 404
+
+
+def test_stale_dist_falls_back_to_in_memory_build(app_module, tmp_path, monkeypatch):
+    stale = app_module._build_asset_bundle('<html><style>body{}</style><script>var a;</script></html>')
+    app_module._write_asset_bundle(stale, str(tmp_path))
+    monkeypatch.setattr(app_module, '_read_asset_bundle',
+                        functools.partial(app_module._read_asset_bundle, out_dir=str(tmp_path)))
+    monkeypatch.setattr(app_module, '_asset_bundle', None)
+
+    bundle = app_module._get_asset_bundle()
+    assert bundle[app_module._ASSET_MANIFEST]['source_sha256'] != stale[app_module._ASSET_MANIFEST]['source_sha256']
+    assert set(bundle) != set(stale)
+
+    # 与当前源文件一致的构建产物会被直接读取
+    app_module._write_asset_bundle(bundle, str(tmp_path))
+    monkeypatch.setattr(app_module, '_asset_bundle', None)
+    reread = app_module._get_asset_bundle()
+    assert reread.keys() == bundle.keys()
+    assert all(reread[n]['identity'] == bundle[n]['identity'] for n in bundle if n != app_module._ASSET_MANIFEST)
@@ -0,0 +1,78 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import select
+
+import catalog_io
+
+
+def test_stream_pages_by_id_without_holding_read_lock(app_module):
+    A = app_module
+    with A.app.app_context():
+        expected = [row[0] for row in A.db.session.query(A.Food.id).order_by(A.Food.id).all()]
+        chunks = catalog_io.stream_catalog(A.db.session, A.Food, 'ndjson', batch_size=7)
+        first = next(chunks)
+
+        # 模拟客户端读得很慢：两批之间其他连接的写入不能被导出的读锁阻塞
+        other = sqlite3.connect(A._sqlite_path, timeout=0.2)
+        try:
+            with other:
+                other.execute("UPDATE catalog_version SET version = version WHERE id = 1")
+        finally:
+            other.close()
+
+        body = first + b''.join(chunks)
+    ids = [json.loads(line)['id'] for line in body.decode('utf-8').splitlines()]
+    assert ids == expected
+
+
+def _catalog_rows(A, with_ids=True):
+    rows = A.db.session.execute(select(A.Food.__table__).order_by(A.Food.id)).all()
+    return [tuple(row) if with_ids else tuple(row)[1:] for row in rows]
+
+
+def _import(A, path, **kwargs):
+    return catalog_io.import_catalog(A.db.session, A.Food, str(path), on_write=A._mark_catalog_changed, **kwargs)
+
+
+def test_columnar_round_trip_bumps_catalog_version(app_module, tmp_path):
+    pytest.importorskip('pyarrow')
+    A = app_module
+    parquet_path, arrow_path = tmp_path / 'foods.parquet', tmp_path / 'foods.arrow'
+    with A.app.app_context():
+        original = _catalog_rows(A)
+        assert catalog_io.export_catalog(A.db.session, A.Food, str(parquet_path), batch_size=100) == len(original)
+        assert catalog_io.export_catalog(A.db.session, A.Food, str(arrow_path), batch_size=100) == len(original)
+        version = A._read_catalog_version()
+        try:
+            # 追加导入：不带 id，新行重新分配 id
+            assert _import(A, arrow_path, batch_size=64) == len(original)
+            assert A._read_catalog_version() == version + 1
+            appended = _catalog_rows(A)
+            assert len(appended) == 2 * len(original)
+            assert [row[1:] for row in appended[len(original):]] == [row[1:] for row in original]
+
+            # 替换导入但不保留 id
+            assert _import(A, arrow_path, replace=True) == len(original)
+            assert A._read_catalog_version() == version + 2
+            assert _catalog_rows(A, with_ids=False) == [row[1:] for row in original]
+        finally:
+            # 替换并沿用文件中的 id，恢复成导出前的目录
+            assert _import(A, parquet_path, replace=True, keep_ids=True) == len(original)
+        assert _catalog_rows(A) == original
+        assert A._read_catalog_version() == version + 3
+
+
+def test_cli_export_without_path_prints_usage(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, SQLITE_PATH=str(tmp_path / 'cli.db'))
+    for command in (['export'], ['import', '--replace'], ['export', 'foo.csv'],
+                    ['import', str(tmp_path / 'missing.parquet')]):
+        proc = subprocess.run([sys.executable, 'app.py', *command], cwd=root, env=env,
+                              capture_output=True, text=True, timeout=60)
+        assert proc.returncode == 2
+        assert '用法' in proc.stdout
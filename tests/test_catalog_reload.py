@@ -0,0 +1,105 @@
+import sqlite3
+import threading
+import time
+
+import requests
+from sqlalchemy import delete, update
+
+
+def test_catalog_reload_under_concurrent_load(app_module, live_server, monkeypatch):
+    A = app_module
+    monkeypatch.setattr(A, 'CATALOG_CHECK_INTERVAL', 0.05)
+    monkeypatch.setattr(A, 'RATE_LIMIT_BURST', float('inf'))
+    monkeypatch.setattr(A, 'RATE_LIMIT_PER_SEC', float('inf'))
+
+    with A.app.app_context():
+        start_version = A._read_catalog_version()
+
+    stop = threading.Event()
+    errors = []
+    versions = {}
+
+    def reader(index):
+        session = requests.Session()
+        seen = versions.setdefault(index, [])
+        try:
+            while not stop.is_set():
+                meal = session.get(f'{live_server}/recommend/meal', params={'user_id': 1, 'time': '午餐'}, timeout=10)
+                foods = session.get(f'{live_server}/debug/foods', timeout=10)
+                admission = session.get(f'{live_server}/debug/admission', timeout=10)
+                for resp in (meal, foods, admission):
+                    if resp.status_code != 200:
+                        errors.append((resp.url, resp.status_code))
+                foods.json()
+                seen.append(admission.json()['catalog_version'])
+        except Exception as e:  # 任何异常都算失败
+            errors.append(repr(e))
+
+    readers = [threading.Thread(target=reader, args=(i,)) for i in range(6)]
+    for t in readers:
+        t.start()
+
+    # 本进程通过 ORM 写入（after_flush / 批量 update 两条路径）
+    with A.app.app_context():
+        for i in range(10):
+            A.db.session.add(A.Food(food_name=f'reload-test-{i}', calories=100, sugar_content=0, food_type='蔬菜',
+                                    recommend_time='午餐', weather_conditions='晴天,阴天,雨天,寒冷', allergens='无'))
+            A.db.session.commit()
+            time.sleep(0.05)
+        A.db.session.execute(update(A.Food).where(A.Food.food_name.like('reload-test-%')).values(calories=A.Food.calories + 1))
+        A.db.session.commit()
+        time.sleep(0.1)
+
+    # 另一个 worker 的写入：在同一事务内写 Food 并递增版本号，本进程只能靠定期读取版本号发现
+    other = sqlite3.connect(A._sqlite_path, timeout=10)
+    with other:
+        other.execute("INSERT INTO food (food_name, calories, sugar_content, food_type, recommend_time, weather_conditions, allergens)"
+                      " VALUES ('reload-test-other', 90, 0, '蔬菜', '午餐', '晴天,阴天,雨天,寒冷', '无')")
+        other.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+    other.close()
+    time.sleep(0.3)
+
+    stop.set()
+    for t in readers:
+        t.join()
+
+    try:
+        assert errors == []
+        for seen in versions.values():
+            assert seen, '读线程没有完成任何请求'
+            assert seen == sorted(seen)
+        # 10 次插入 + 1 次批量更新 + 外部写入
+        assert max(max(seen) for seen in versions.values()) == start_version + 12
+
+        foods = {f['food_name']: f for f in requests.get(f'{live_server}/debug/foods', timeout=10).json()}
+        for i in range(10):
+            assert foods[f'reload-test-{i}']['calories'] == 101
+        assert 'reload-test-other' in foods
+
+        names = [f['food_name'] for f in requests.get(
+            f'{live_server}/recommend', params={'user_id': 1, 'time': '午餐', 'max_calories': 1000}, timeout=10
+        ).json()['recommendations']]
+        assert 'reload-test-other' in names and 'reload-test-0' in names
+    finally:
+        with A.app.app_context():
+            A.db.session.execute(delete(A.Food).where(A.Food.food_name.like('reload-test-%')))
+            A.db.session.commit()
+
+
+def test_stale_version_read_never_replaces_newer_state(app_module, monkeypatch):
+    # 模拟提交前读到旧版本号、但在另一个线程切换到新版本之后才拿到锁的线程
+    A = app_module
+    monkeypatch.setattr(A, 'CATALOG_CHECK_INTERVAL', 0.0)
+    with A.app.app_context():
+        current = A._sync_catalog_state()
+        current['payloads']['marker'] = b'newer'
+        monkeypatch.setattr(A, '_read_catalog_version', lambda: current['version'] - 1)
+        assert A._sync_catalog_state() is current
+
+        monkeypatch.setattr(A, '_read_catalog_version', lambda: None)
+        assert A._sync_catalog_state() is current
+
+        monkeypatch.setattr(A, '_read_catalog_version', lambda: current['version'] + 1)
+        newer = A._sync_catalog_state()
+        assert newer['version'] == current['version'] + 1
+        assert newer['payloads'] == {}
@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import delete
+
+
+def _cleanup(A, user_id):
+    A._flush_events()
+    with A.app.app_context():
+        A.db.session.execute(delete(A.FoodAffinity).where(A.FoodAffinity.user_id == user_id))
+        A.db.session.execute(delete(A.FoodEvent).where(A.FoodEvent.user_id == user_id))
+        A.db.session.commit()
+    A._affinity.pop(user_id, None)
+    A._affinity_loaded_at.pop(user_id, None)
+
+
+def test_affinity_sees_events_flushed_by_other_workers(app_module, client, monkeypatch):
+    A = app_module
+    user_id, local_food, remote_food = 9001, 11, 12
+    try:
+        resp = client.post('/events', json=[
+            {'user_id': user_id, 'food_id': local_food, 'type': 'accept'},
+            {'user_id': user_id, 'food_id': local_food, 'type': 'accept'},
+        ])
+        assert resp.status_code == 202
+        with A.app.app_context():
+            assert A._get_affinity(user_id) == {local_food: 2.0}
+
+        # 另一个 worker 落库了同一用户的事件
+        other = sqlite3.connect(A._sqlite_path, timeout=10)
+        with other:
+            other.execute("INSERT INTO food_affinity (user_id, food_id, score) VALUES (?, ?, ?)", (user_id, remote_food, -1.0))
+        other.close()
+
+        with A.app.app_context():
+            assert remote_food not in A._get_affinity(user_id)  # 缓存未过期
+
+            monkeypatch.setattr(A, 'AFFINITY_TTL', 0.0)
+            scores = A._get_affinity(user_id)
+            # 本进程的增量无论是否已落库都只计一次
+            assert scores == {local_food: 2.0, remote_food: -1.0}
+
+            A._flush_events()
+            assert A._get_affinity(user_id) == {local_food: 2.0, remote_food: -1.0}
+    finally:
+        _cleanup(A, user_id)
+
+
+@pytest.mark.parametrize('event', [
+    {'user_id': 1, 'food_id': 11, 'type': ['accept']},
+    {'user_id': 1, 'food_id': 11, 'type': {'accept': 1}},
+    {'user_id': 1.7, 'food_id': 11, 'type': 'accept'},
+    {'user_id': True, 'food_id': 11, 'type': 'accept'},
+    {'user_id': 1, 'food_id': '11.5', 'type': 'accept'},
+    {'user_id': 1, 'food_id': 11, 'type': 'swap', 'from_food_id': 2.0},
+])
+def test_malformed_events_are_rejected(app_module, client, event):
+    buffered = len(app_module._event_buffer)
+    resp = client.post('/events', json=[{'user_id': 1, 'food_id': 11, 'type': 'accept'}, event])
+    assert resp.status_code == 400
+    assert len(app_module._event_buffer) == buffered
+
+
+def test_event_batch_size_is_capped(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'EVENT_MAX_PER_REQUEST', 3)
+    events = [{'user_id': 9002, 'food_id': 11, 'type': 'accept'}] * 4
+    resp = client.post('/events', json={'events': events})
+    assert resp.status_code == 413
+    assert not any(e[0] == 9002 for e in app_module._event_buffer)
+
+
+def test_events_share_per_client_rate_limit(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_BURST', 2)
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_PER_SEC', 0.0)
+    statuses = [client.post('/events', json={'user_id': 9003, 'food_id': 11, 'type': 'reject'}).status_code for _ in range(3)]
+    try:
+        assert statuses == [202, 202, 429]
+        assert app_module._admission_stats['events']['shed_rate_limited'] == 1
+    finally:
+        _cleanup(app_module, 9003)
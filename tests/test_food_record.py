@@ -0,0 +1,62 @@
+import pytest
+
+
+def _record(app_module, **overrides):
+    fields = dict(id=1, food_name='虾仁豆腐', calories='200', sugar_content=None, food_type='蛋白',
+                  recommend_time='晚餐', weather_conditions='晴天', allergens='虾, 大豆', image_url=None)
+    fields.update(overrides)
+    return app_module.FoodRecord(**fields)
+
+
+def test_record_is_read_only(app_module):
+    food = _record(app_module)
+    with pytest.raises(AttributeError):
+        food.calories = 1
+    with pytest.raises(AttributeError):
+        food.extra = 1
+    assert not hasattr(food, '__dict__')
+
+
+def test_record_casts_and_splits_allergens(app_module):
+    food = _record(app_module)
+    assert food.calories == 200 and food.sugar_content == 0.0
+    assert food.allergen_set == frozenset({'虾', '大豆'})
+    assert _record(app_module, allergens=None).allergen_set == frozenset()
+    assert _record(app_module, allergens='花生').allergen_set.isdisjoint({'虾'})
+
+
+def test_records_match_orm_rows(app_module):
+    A = app_module
+    with A.app.app_context():
+        orm = {f.id: A._food_to_dict(f) for f in A.Food.query.all()}
+        records = {f.id: A._food_to_dict(f) for f in A._query_food_records()}
+    assert records == orm
+
+
+def test_recommend_matches_orm_filtering(app_module, client, monkeypatch):
+    # 用 ORM 实例按同样的规则独立算一遍：糖尿病用户（过敏：花生,牛奶），晴天，午餐
+    A = app_module
+    monkeypatch.setattr(A, 'RATE_LIMIT_BURST', float('inf'))
+    with A.app.app_context():
+        user = A.db.session.get(A.User, 1)
+        allergic = {a.strip() for a in user.allergic_foods.split(',')}
+        foods = A.Food.query.filter(A.Food.recommend_time == '午餐', A.Food.calories <= 500,
+                                    A.Food.weather_conditions.like('%晴天%')).all()
+        low_sugar = [f for f in foods if f.sugar_content <= 5] or foods
+        ordered = sorted(low_sugar, key=lambda f: (f.sugar_content, f.calories))
+        expected = [f.food_name for f in ordered
+                    if not ({a.strip() for a in f.allergens.split(',')} if f.allergens else set()) & allergic]
+
+    body = client.get('/recommend', query_string={'user_id': 1, 'time': '午餐'}).get_json()
+    assert [f['food_name'] for f in body['recommendations']] == expected
+
+
+def test_missing_nutrient_fields_are_reported_not_assumed(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_BURST', float('inf'))
+    # 只在 ORM 模型上出现的字段不会进入 FoodRecord，不能据此声称已按低盐/低脂筛选
+    monkeypatch.setattr(app_module.Food, 'salt_content', 0.0, raising=False)
+    monkeypatch.setattr(app_module.Food, 'fat_content', 0.0, raising=False)
+    meta = client.get('/recommend/meal', query_string={'user_id': 1, 'time': '午餐', 'condition': '高血压,高血脂'}).get_json()['meta']
+    assert not hasattr(app_module.FoodRecord, 'salt_content')
+    assert '当前食物库无盐分字段，高血压仅做保守排序：优先低热量/低糖' in meta['condition_notes']
+    assert '当前食物库无脂肪字段，高血脂仅做保守排序：优先低热量/低糖' in meta['condition_notes']
@@ -0,0 +1,99 @@
+import threading
+import time
+import tracemalloc
+
+import pytest
+import requests
+
+TOKEN = 'test-profile-token'
+HEADERS = {'X-Admin-Token': TOKEN}
+
+
+@pytest.fixture
+def profiling(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'PROFILE_TOKEN', TOKEN)
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_BURST', float('inf'))
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_PER_SEC', float('inf'))
+    client.delete('/admin/profile', headers=HEADERS)
+    yield client
+    client.delete('/admin/profile', headers=HEADERS)
+
+
+def _arm(client, **plan):
+    resp = client.post('/admin/profile', headers=HEADERS, json={'route': '/recommend/meal', **plan})
+    assert resp.status_code == 202
+
+
+def _results(client):
+    return client.get('/admin/profile', headers=HEADERS).get_json()
+
+
+def test_overlapping_requests_profile_one_at_a_time(app_module, profiling, live_server, monkeypatch):
+    entered = threading.Event()
+
+    def slow_weather(city='Beijing'):
+        entered.set()
+        time.sleep(0.3)
+        return 'Clear'
+
+    monkeypatch.setattr(app_module, 'get_weather', slow_weather)
+    _arm(profiling, count=2, tracemalloc=True)
+
+    statuses = []
+
+    def call():
+        statuses.append(requests.get(f'{live_server}/recommend/meal', params={'user_id': 1, 'time': '午餐'}, timeout=10).status_code)
+
+    first = threading.Thread(target=call)
+    first.start()
+    assert entered.wait(5)
+    call()  # 与第一个请求重叠：不剖析，计划保持
+    first.join()
+
+    assert statuses == [200, 200]
+    state = _results(profiling)
+    assert len(state['results']) == 1
+    assert state['armed']['remaining'] == 1
+    assert state['results'][0]['tracemalloc'][-1]['label'] == 'request_end'
+    assert not tracemalloc.is_tracing()
+
+    call()
+    state = _results(profiling)
+    assert len(state['results']) == 2
+    assert state['armed'] is None
+    assert state['results'][1]['tracemalloc'][-1]['label'] == 'request_end'
+    assert not tracemalloc.is_tracing()
+
+
+def test_profiler_conflict_skips_profile_without_failing_request(app_module, profiling, monkeypatch):
+    import cProfile
+
+    class BusyProfile:
+        def enable(self):
+            raise ValueError('Another profiling tool is already active')
+
+    with monkeypatch.context() as m:
+        m.setattr(cProfile, 'Profile', BusyProfile)
+        _arm(profiling, count=1, tracemalloc=True)
+        resp = profiling.get('/recommend/meal', query_string={'user_id': 1, 'time': '午餐'})
+
+    assert resp.status_code == 200
+    assert _results(profiling)['results'] == []
+    assert not tracemalloc.is_tracing()
+    assert app_module._profile_active is False
+
+    # 冲突释放了会话，下一次剖析照常进行
+    _arm(profiling, count=1)
+    profiling.get('/recommend/meal', query_string={'user_id': 1, 'time': '午餐'})
+    assert len(_results(profiling)['results']) == 1
+
+
+def test_tracemalloc_started_elsewhere_is_left_running(app_module, profiling):
+    tracemalloc.start()
+    try:
+        _arm(profiling, count=1, tracemalloc=True)
+        profiling.get('/recommend/meal', query_string={'user_id': 1, 'time': '午餐'})
+        assert tracemalloc.is_tracing()
+        assert 'tracemalloc' in _results(profiling)['results'][0]
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,58 @@
+import itertools
+import json
+
+import pytest
+
+MEALS = ['早餐', '午餐', '晚餐']
+
+
+@pytest.fixture
+def day_client(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_BURST', float('inf'))
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_PER_SEC', float('inf'))
+    return client
+
+
+def test_plan_is_ordered_on_the_wire(day_client):
+    resp = day_client.get('/recommend/day', query_string={'user_id': 1})
+    assert resp.status_code == 200
+    plan = json.loads(resp.get_data(as_text=True))['plan']
+    assert [entry['time'] for entry in plan] == MEALS
+
+
+@pytest.mark.parametrize('max_calories,condition', list(itertools.product([100, 200, 500], [None, '糖尿病', '无'])))
+def test_day_plan_matches_separate_meal_requests(app_module, day_client, max_calories, condition):
+    args = {'user_id': 1, 'max_calories': max_calories}
+    if condition:
+        args['condition'] = condition
+
+    plan = day_client.get('/recommend/day', query_string=args).get_json()['plan']
+    app_module.recent_recommendation_history.clear()
+    for entry in plan:
+        meal = day_client.get('/recommend/meal', query_string={**args, 'time': entry['time']}).get_json()
+        assert {k: v for k, v in entry.items() if k != 'time'} == meal
+
+
+def test_daily_budget_is_respected(day_client):
+    body = day_client.get('/recommend/day', query_string={'user_id': 1, 'max_calories': 800, 'daily_calories': 600}).get_json()
+    assert body['nutrition_total']['calories'] <= 600
+    budgets = [entry['meta']['calorie_budget'] for entry in body['plan']]
+    assert budgets[0] == 180
+    for entry in body['plan']:
+        if entry['meal']:
+            assert entry['meal']['nutrition_total']['calories'] <= entry['meta']['calorie_budget']
+
+    assert day_client.get('/recommend/day', query_string={'user_id': 1, 'daily_calories': 0}).status_code == 400
+    assert day_client.get('/recommend/day', query_string={'user_id': 999999}).status_code == 404
+
+
+def test_tiny_budget_reports_shortfall(day_client):
+    body = day_client.get('/recommend/day', query_string={'user_id': 1, 'daily_calories': 50}).get_json()
+    assert body['nutrition_total']['calories'] <= 50
+    short = [entry for entry in body['plan'] if entry['meal'] is None]
+    assert short and short[0]['time'] == '早餐'
+    assert all(entry['message'] == '热量预算不足，未能安排本餐' for entry in short)
+
+    body = day_client.get('/recommend/day', query_string={'user_id': 1, 'daily_calories': 10}).get_json()
+    assert all(entry['meal'] is None for entry in body['plan'])
+    assert body['message'] == '热量预算不足，未能安排任何一餐'
@@ -0,0 +1,50 @@
+import hashlib
+import time
+
+import replay
+
+
+def _capture(app_module, client, tmp_path, monkeypatch, requests_to_send):
+    log = tmp_path / 'capture.jsonl'
+    monkeypatch.setattr(app_module, 'CAPTURE_LOG', str(log))
+    monkeypatch.setattr(app_module, 'CAPTURE_SAMPLE_RATE', 1.0)
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_BURST', float('inf'))
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_PER_SEC', float('inf'))
+    for path, args in requests_to_send:
+        assert client.get(path, query_string=args).status_code == 200
+    monkeypatch.setattr(app_module, 'CAPTURE_LOG', None)
+    return replay.load_records(str(log))
+
+
+def _replay(app_module, client, records, monkeypatch):
+    monkeypatch.setattr(app_module, 'REPLAY_MODE', True)
+    app_module.recent_recommendation_history.clear()
+    results = []
+    for record in records:
+        resp = client.get(record['path'], query_string=record['args'], headers=replay.replay_headers(record))
+        results.append((resp.status_code, hashlib.sha1(resp.get_data()).hexdigest()))
+    return results
+
+
+def test_degraded_requests_replay_identically(app_module, client, tmp_path, monkeypatch):
+    sent = [('/recommend/meal', {'user_id': '1', 'time': t}) for t in ('早餐', '午餐', '晚餐', '午餐')]
+    sent.append(('/recommend/day', {'user_id': '1'}))
+
+    # 天气接口变慢期间录制：所有请求都处于降级模式
+    app_module._weather_slow_until = time.monotonic() + 60
+    degraded = _capture(app_module, client, tmp_path, monkeypatch, sent)
+    app_module._weather_slow_until = 0.0
+    assert [r['degrade_reason'] for r in degraded] == ['weather_slow'] * len(sent)
+
+    results = _replay(app_module, client, degraded, monkeypatch)
+    assert results == [(r['status'], r['digest']) for r in degraded]
+
+
+def test_replay_forces_normal_mode_for_normal_records(app_module, client, tmp_path, monkeypatch):
+    records = _capture(app_module, client, tmp_path, monkeypatch, [('/recommend/meal', {'user_id': '1', 'time': '午餐'})])
+    assert records[0]['degrade_reason'] is None
+
+    # 回放时即使处于降级条件下，也按录制时的正常模式执行
+    app_module._weather_slow_until = time.monotonic() + 60
+    results = _replay(app_module, client, records, monkeypatch)
+    assert results == [(records[0]['status'], records[0]['digest'])]
@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+from fake_openweather import FakeOpenWeather
+
+
+@pytest.fixture(scope='module')
+def fake_upstream():
+    fake = FakeOpenWeather().start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def upstream(app_module, fake_upstream, monkeypatch):
+    fake_upstream.reset()
+    monkeypatch.setattr(app_module, 'api_key', 'test-key')
+    monkeypatch.setattr(app_module, 'OPENWEATHER_API_BASE', fake_upstream.base_url)
+    monkeypatch.setattr(app_module, 'WEATHER_PREFETCH_MIN_INTERVAL', 0.0)
+    return fake_upstream
+
+
+def _age_entry(app_module, key, seconds):
+    app_module._weather_cache[key]['fetched_at'] -= seconds
+
+
+def test_city_aliases_share_one_entry(app_module, upstream):
+    assert app_module.get_weather('北京') == 'Clear'
+    assert app_module.get_weather('Beijing') == 'Clear'
+    assert app_module.get_weather(' beijing ') == 'Clear'
+
+    assert upstream.paths() == ['weather']
+    assert list(app_module._weather_cache) == ['beijing']
+    assert app_module._weather_cache['beijing']['city_id'] == 1816670
+
+
+def test_prefetch_batches_known_city_ids_through_group(app_module, upstream):
+    for city in ('Beijing', '上海', 'Guangzhou'):
+        app_module.get_weather(city)
+    upstream.reset()
+    for key in ('beijing', 'shanghai', 'guangzhou'):
+        _age_entry(app_module, key, app_module.WEATHER_CACHE_TTL)
+
+    calls = app_module._prefetch_weather_once()
+
+    assert calls == 1
+    assert upstream.paths() == ['group']
+    requested = set(upstream.calls[0][1]['id'].split(','))
+    assert requested == {'1816670', '1796236', '1809858'}
+    now = time.monotonic()
+    assert all(now - app_module._weather_cache[k]['fetched_at'] < 5 for k in ('beijing', 'shanghai', 'guangzhou'))
+
+
+def test_cached_reads_do_not_block_on_upstream(app_module, upstream, monkeypatch):
+    app_module.get_weather('Chengdu')
+    upstream.reset()
+    upstream.delay = 1.0
+    # 预取线程在运行时，过期但未超过 STALE_MAX 的旧值直接返回，由预取线程补刷
+    monkeypatch.setattr(app_module, '_ensure_weather_prefetcher', lambda: True)
+
+    started = time.perf_counter()
+    assert app_module.get_weather('成都') == 'Mist'
+    _age_entry(app_module, 'chengdu', app_module.WEATHER_CACHE_TTL + 1)
+    assert app_module.get_weather('Chengdu') == 'Mist'
+    assert time.perf_counter() - started < 0.2
+    assert upstream.paths() == []
+
+
+def test_failed_refresh_backs_off(app_module, upstream):
+    app_module.get_weather('Beijing')
+    _age_entry(app_module, 'beijing', app_module.WEATHER_CACHE_TTL)
+    upstream.reset()
+    upstream.status = 500
+
+    assert app_module._prefetch_weather_once() == 1
+    assert app_module._prefetch_weather_once() == 0
+    entry = app_module._weather_cache['beijing']
+    assert entry['failures'] == 1
+    assert entry['next_attempt_at'] - time.monotonic() > app_module.WEATHER_BACKOFF_BASE - 1
+
+    # 退避到期后重试，再失败则间隔翻倍
+    entry['next_attempt_at'] = 0.0
+    assert app_module._prefetch_weather_once() == 1
+    assert entry['failures'] == 2
+    assert entry['next_attempt_at'] - time.monotonic() > 2 * app_module.WEATHER_BACKOFF_BASE - 1
+    assert upstream.paths() == ['group', 'group']
+
+
+def test_rate_limited_upstream_pauses_all_calls(app_module, upstream):
+    app_module.get_weather('Beijing')
+    app_module.get_weather('Shanghai')
+    for key in ('beijing', 'shanghai'):
+        _age_entry(app_module, key, app_module.WEATHER_STALE_MAX + 1)
+    upstream.reset()
+    upstream.status = 429
+    upstream.retry_after = 60
+
+    assert app_module.get_weather('Beijing') is None
+    assert app_module.get_weather('Shanghai') is None
+    assert app_module.get_weather('Guangzhou') is None
+    assert app_module._prefetch_weather_once() == 0
+    assert upstream.paths() == ['weather']
+    assert 55 < app_module._weather_paused_until - time.monotonic() <= 60
+
+
+def test_city_activity_is_bounded_without_prefetcher(app_module):
+    for i in range(app_module._CITY_ACTIVITY_SIZE + 50):
+        app_module._touch_city(f'city-{i}', time.monotonic())
+    assert len(app_module._city_activity) == app_module._CITY_ACTIVITY_SIZE
+    assert 'city-0' not in app_module._city_activity